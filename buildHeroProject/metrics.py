@@ -0,0 +1,212 @@
+"""
+Per-request performance instrumentation.
+PerformanceMiddleware measures DB queries (count and time), template
+rendering and total latency of every request, sends them back in a
+``Server-Timing`` header and aggregates them per view into in-process
+histograms, exposed in Prometheus text format by ``metrics_view``.
+Every worker process keeps its own numbers and labels every series with
+its ``pid``, so the scrapes of different workers behind one address are
+separate series; sum them over ``pid`` for the totals.
+Queries are counted on every connection, so DB work handed to other
+threads by async views is included.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    __slots__ = ("queries", "db", "template")
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def exposition(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.db_seconds = defaultdict(float)
+        self.template_seconds = defaultdict(float)
+
+    def observe(self, view, total, timings):
+        with self._lock:
+            self.latency[view].observe(total)
+            self.queries[view].observe(timings.queries)
+            self.db_seconds[view] += timings.db
+            self.template_seconds[view] += timings.template
+
+    def exposition(self):
+        pid = os.getpid()
+        with self._lock:
+            lines = [
+                "# HELP buildhero_request_duration_seconds Request latency per view.",
+                "# TYPE buildhero_request_duration_seconds histogram",
+            ]
+            for view, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.exposition("buildhero_request_duration_seconds", f'pid="{pid}",view="{view}"'))
+
+            lines += [
+                "# HELP buildhero_db_queries DB queries per request per view.",
+                "# TYPE buildhero_db_queries histogram",
+            ]
+            for view, histogram in sorted(self.queries.items()):
+                lines.extend(histogram.exposition("buildhero_db_queries", f'pid="{pid}",view="{view}"'))
+
+            for name, values, help_text in (
+                ("buildhero_db_duration_seconds_total", self.db_seconds, "Time spent in DB queries."),
+                ("buildhero_template_duration_seconds_total", self.template_seconds, "Time spent rendering templates."),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines.extend(f'{name}{{pid="{pid}",view="{view}"}} {value}' for view, value in sorted(values.items()))
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db += time.perf_counter() - start
+
+
+def _install(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@receiver(connection_created)
+def _connection_created(connection, **kwargs):
+    _install(connection)
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self._acall(request)
+
+        # connections opened before this module was imported
+        _install(connection)
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+
+        return self._finish(request, response, timings, time.perf_counter() - start)
+
+    async def _acall(self, request):
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+
+        return self._finish(request, response, timings, time.perf_counter() - start)
+
+    @staticmethod
+    def _finish(request, response, timings, total):
+        match = request.resolver_match
+        view = match.view_name if match else "<unresolved>"
+        registry.observe(view, total, timings)
+        response["Server-Timing"] = (
+            f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries", '
+            f"tpl;dur={timings.template * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}"
+        )
+
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings = _timings.get()
+            if timings is not None:
+                timings.template += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, reporting render time to PerformanceMiddleware."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+@staff_member_required
+def metrics_view(request):
+    return HttpResponse(registry.exposition(), content_type="text/plain; version=0.0.4")
@@ -15,6 +15,17 @@ import dotenv
 from django.contrib.messages import constants as messages
 
 
+def env_flag(name, default=False):
+    """A yes/no environment variable: 1, true, yes or on are yes."""
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_seconds(name, default):
+    """Seconds from an environment variable, "none" means no limit."""
+    value = os.getenv(name, str(default)).strip().lower()
+    return None if value == 'none' else int(value)
+
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -29,7 +40,7 @@ if os.path.isfile(dotenv_file):
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY', '')
 
-DEBUG = os.getenv('DEBUG', False)
+DEBUG = env_flag('DEBUG')
 
 ALLOWED_HOSTS = ['*']
 
@@ -44,24 +55,32 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'buildHeroProject.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'buildHeroProject.staticfiles.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'wwwhero.middleware.ActiveCharacterMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'buildHeroProject.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'buildHeroProject.metrics.TimedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # compiled templates are kept per process, except while developing
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -78,7 +97,33 @@ WSGI_APPLICATION = 'buildHeroProject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {'default': dj_database_url.config()}
+# Connection reuse: DB_CONN_MAX_AGE seconds a connection stays open for the next
+# requests of its thread (0 reconnects on every request, "none" keeps it forever).
+# With DB_CONN_HEALTH_CHECKS a reused connection is pinged before a request runs
+# on it (wwwhero/dbpool.py, Django 4.1 does this itself). A worker holds one
+# connection per thread, DB_POOL_SIZE in gunicorn.conf.py.
+# DB_PGBOUNCER disables server side cursors, which transaction pooling breaks.
+
+DATABASES = {'default': dj_database_url.config(conn_max_age=env_seconds('DB_CONN_MAX_AGE', 0))}
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env_flag('DB_CONN_HEALTH_CHECKS')
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = env_flag('DB_PGBOUNCER')
+
+# Cache
+# Version stamps of the in-process caches (wwwhero/versions.py) live here,
+# so multi-process deployments want a backend all processes share, e.g.
+# memcached. With a process-local one each process only sees its own bumps
+# and the others catch up when their stamps expire.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds a version stamp lives in the cache, bounding how long a process
+# that missed a bump keeps serving stale data; "none" keeps stamps forever
+VERSION_STAMP_TTL = env_seconds('VERSION_STAMP_TTL', 60)
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -120,6 +165,20 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'static'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Uploaded images, their resized variants are served from MEDIA_URL/variants/
+# (wwwhero/images.py)
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / 'media')
+MEDIA_URL = '/media/'
+
+# Sessions: "db" reads django_session on every request and writes it on change,
+# "cached_db" reads through the cache, "signed_cookies" keeps the session in a
+# signed cookie and needs no storage. The last two keep flash messages in a
+# cookie too, so no request touches django_session for them
+SESSION_MODE = os.getenv('SESSION_MODE', 'db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_MODE}'
+if SESSION_MODE != 'db':
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 MESSAGE_TAGS = {
     messages.DEBUG: 'alert-info',
     messages.INFO: 'alert-info',
@@ -129,3 +188,23 @@ MESSAGE_TAGS = {
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+# Seconds a rendered location list of the map is cached
+MAP_FRAGMENT_CACHE_TIMEOUT = int(os.getenv('MAP_FRAGMENT_CACHE_TIMEOUT', 3600))
+
+# Max number of drops a single batch loot request can roll
+LOOT_BATCH_MAX = int(os.getenv('LOOT_BATCH_MAX', 10))
+
+# Page view counting: "sync" writes every visit immediately,
+# "buffered" collects them in-process and flushes them in bulk
+VISIT_COUNTER_MODE = os.getenv('VISIT_COUNTER_MODE', 'sync')
+VISIT_COUNTER_FLUSH_INTERVAL = float(os.getenv('VISIT_COUNTER_FLUSH_INTERVAL', 5))
+
+# Compile the templates and load the reference data caches when the app
+# starts instead of on the first requests (wwwhero/warmup.py), set by
+# gunicorn.conf.py
+WARM_UP = env_flag('WARM_UP')
+
+# Threads per process running the DB work of async views (wwwhero/dbpool.py),
+# 0 keeps the pooled views sync, which is enough under WSGI
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 0))
@@ -0,0 +1,33 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that can sit in an async middleware chain.
+
+    WhiteNoise 5 is sync only, which under ASGI makes Django run every
+    middleware and view below it through the single sync thread of the
+    process. Looking up a static file is a dict access and serving it only
+    builds a streaming response, so both are fine on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self._acall(request)
+
+        return super().__call__(request)
+
+    async def _acall(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+
+        return response
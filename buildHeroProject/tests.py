@@ -0,0 +1,73 @@
+import os
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from buildHeroProject.metrics import Histogram
+from buildHeroProject.settings import env_flag, env_seconds
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def test_server_timing_header(self):
+        response = self.client.get("/")
+
+        timing = response["Server-Timing"]
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="0 queries"', timing)
+        self.assertIn("tpl;dur=", timing)
+        self.assertIn("total;dur=", timing)
+
+    def test_counts_view_queries(self):
+        user = User.objects.create_user(username="Bob", password="strong!1")
+        self.client.force_login(user)
+
+        response = self.client.get("/")
+
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+    def test_metrics_are_staff_only(self):
+        user = User.objects.create_user(username="Bob", password="strong!1")
+        self.client.force_login(user)
+
+        self.assertEqual(self.client.get("/metrics").status_code, 302)
+
+        user.is_staff = True
+        user.save()
+        self.client.get("/")
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        series = f'buildhero_request_duration_seconds_count{{pid="{os.getpid()}",view="index"}}'
+        self.assertIn(series, response.content.decode())
+
+
+class HistogramTests(TestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 7):
+            histogram.observe(value)
+
+        self.assertEqual(list(histogram.exposition("x", 'view="v"')), [
+            'x_bucket{view="v",le="1"} 2',
+            'x_bucket{view="v",le="5"} 3',
+            'x_bucket{view="v",le="+Inf"} 4',
+            'x_sum{view="v"} 11',
+            'x_count{view="v"} 4',
+        ])
+
+
+class EnvironmentTests(TestCase):
+    def test_flags(self):
+        for value, expected in (("1", True), ("True", True), ("on", True), ("False", False), ("0", False), ("", False)):
+            with mock.patch.dict(os.environ, {"SOME_FLAG": value}):
+                self.assertIs(env_flag("SOME_FLAG"), expected, value)
+
+        self.assertFalse(env_flag("NO_SUCH_FLAG"))
+        self.assertTrue(env_flag("NO_SUCH_FLAG", default=True))
+
+    def test_seconds(self):
+        with mock.patch.dict(os.environ, {"SOME_SECONDS": "None"}):
+            self.assertIsNone(env_seconds("SOME_SECONDS", 0))
+
+        self.assertEqual(env_seconds("NO_SUCH_SECONDS", 60), 60)
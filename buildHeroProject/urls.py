@@ -15,7 +15,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from buildHeroProject.metrics import metrics_view
+
 urlpatterns = [
     path('', include('wwwhero.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 ]
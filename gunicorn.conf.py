@@ -0,0 +1,63 @@
+"""Gunicorn settings, read from the working directory on start.
+
+``SERVER_MODE=asgi`` serves ``buildHeroProject.asgi`` with uvicorn workers
+and a DB thread pool per worker (``ASYNC_DB_THREADS``), otherwise the WSGI
+application runs in sync workers, threaded when there is more than one
+thread.
+
+``DB_POOL_SIZE`` is the number of threads, and so of persistent database
+connections (``DB_CONN_MAX_AGE``), per worker: it sizes the DB thread pool
+under ASGI (default 8) and the worker threads under WSGI (default 1).
+
+The application is loaded and warmed up (``WARM_UP``, wwwhero/warmup.py)
+once in the master, before the workers are forked; ``GUNICORN_PRELOAD=0``
+loads it in every worker instead. The time until the server is ready and
+the warm-up steps are logged.
+
+More than one worker refuses to start with a process-local cache backend,
+see wwwhero/checks.py.
+"""
+import os
+import time
+
+_started = time.monotonic()
+
+if os.getenv("SERVER_MODE") == "asgi":
+    wsgi_app = "buildHeroProject.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    os.environ.setdefault("ASYNC_DB_THREADS", os.getenv("DB_POOL_SIZE", "8"))
+else:
+    wsgi_app = "buildHeroProject.wsgi:application"
+    worker_class = "sync"
+    # gunicorn switches sync workers to gthread for more than one thread
+    threads = int(os.getenv("DB_POOL_SIZE", 1))
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").strip().lower() in ("1", "true", "yes", "on")
+os.environ.setdefault("WARM_UP", "1")
+
+
+def _log_warm_up(log, process):
+    from wwwhero import warmup
+
+    if warmup.timings:
+        steps = ", ".join(f"{name} {ms:.1f} ms" for name, ms in warmup.timings.items())
+        log.info("Warmed up %s: %s", process, steps)
+
+
+def on_starting(server):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "buildHeroProject.settings")
+    from wwwhero.checks import check_shared_cache
+
+    for warning in check_shared_cache(server.cfg.workers):
+        server.log.warning("%s: %s %s", warning.id, warning.msg, warning.hint)
+
+
+def when_ready(server):
+    server.log.info("Ready in %.0f ms", (time.monotonic() - _started) * 1000)
+    if preload_app:
+        _log_warm_up(server.log, "master")
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _log_warm_up(worker.log, f"worker {worker.pid}")
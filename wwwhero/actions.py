@@ -0,0 +1,74 @@
+"""Game actions shared by the HTML views and the JSON API.
+
+Every action returns an ``Outcome``: whether it succeeded and the message
+for the player. The callers decide how to deliver it, a flash message and
+a redirect or a JSON body.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from wwwhero import conditional, loot, snapshots
+from wwwhero.catalog import get_catalog
+from wwwhero.exceptions import InventoryFullError, LevelUpCooldownError, MaxLevelError
+from wwwhero.models import Item
+
+Outcome = namedtuple("Outcome", "ok message")
+
+
+def level_up(character):
+    try:
+        character.level_up()
+    except LevelUpCooldownError:
+        return Outcome(False, "Nice try, but no! You have a level up cooldown.")
+    except MaxLevelError:
+        return Outcome(False, f"You are too strong already. Max level {character.MAX_LEVEL} reached.")
+
+    return Outcome(True, f"Congrats! Now you're level {character.level}.")
+
+
+def search(active, times=1):
+    if not active.character_location:
+        raise Http404("No location selected")
+    times = max(1, min(times, settings.LOOT_BATCH_MAX))
+
+    try:
+        found = loot.search(
+            active.character, active.character_location.location, times, inventory=active.inventory,
+        )
+    except InventoryFullError:
+        return Outcome(False, "Too many items, throw away something or level up")
+
+    found = ", ".join(f"{amount} {name}" if amount > 1 else name for name, amount in found)
+
+    return Outcome(True, f"Yay! You found {found}.")
+
+
+def drop(inventory, item_id, drop_all=False):
+    """Throw away one of a stack, or the whole item.
+
+    Both are conditional UPDATEs of the item as it is in this inventory,
+    so concurrent drops of one item can't free its slot twice and a stack
+    decrement can't overwrite the increments of a concurrent loot.
+    """
+    item = get_object_or_404(Item, id=item_id, inventory=inventory)
+    if not get_catalog().by_id[item.blueprint_id].is_droppable:
+        return Outcome(False, "You can't drop this item.")
+
+    in_inventory = Item.objects.filter(pk=item.pk, inventory=inventory)
+    if not drop_all and item.amount > 1 and in_inventory.filter(amount__gt=1).update(amount=F("amount") - 1):
+        drop_amount = 1
+    else:
+        with transaction.atomic():
+            if not in_inventory.update(inventory=None):
+                raise Http404("No such item in the inventory")
+            inventory.free_slots(1)
+        drop_amount = item.amount if drop_all else 1
+    snapshots.invalidate_on_commit(inventory.id)
+    conditional.touch_on_commit(inventory.character_id)
+
+    return Outcome(True, f"You've thrown away {drop_amount} {item.name}(s)")
@@ -1,36 +1,153 @@
 from django.contrib import admin
 
+from .admin_paging import EstimatedCountPaginator, KeysetPagedAdmin
 from .models import *
 
+# Changelists join what their __str__ and list_display read
+# (list_select_related), pick related rows by id instead of rendering every
+# row of a large table into a <select> (raw_id_fields), and only search and
+# filter on indexed columns: "__exact" lookups, as "=" is a case-insensitive
+# match no index serves.
+
+USERNAME = "user__username__exact"
+
 
 class CharacterAdmin(admin.ModelAdmin):
-    list_display = ("user", "name", "created_at", "updated_at")
+    list_display = ("user", "name", "level", "created_at", "updated_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = (USERNAME,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class CharacterAttributesAdmin(admin.ModelAdmin):
+    list_display = ("character", "max_hp", "hp", "dmg", "luck")
+    list_select_related = ("character",)
+    raw_id_fields = ("character",)
+    search_fields = (f"character__{USERNAME}",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class CharacterCooldownAdmin(admin.ModelAdmin):
     list_display = ("type", "until", "character")
+    list_select_related = ("character__user",)
+    raw_id_fields = ("character",)
+    search_fields = (f"character__{USERNAME}",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class CharacterSelectionAdmin(admin.ModelAdmin):
     list_display = ("user", "character")
+    list_select_related = ("character__user",)
+    raw_id_fields = ("user", "character")
+    search_fields = (USERNAME,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class CharacterLocationAdmin(admin.ModelAdmin):
     list_display = ("character", "location")
+    list_select_related = ("character__user", "location")
+    raw_id_fields = ("character", "location")
+    list_filter = ("location",)
+    search_fields = (f"character__{USERNAME}",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class LocationAdmin(admin.ModelAdmin):
     list_display = ("name", "min_level", "type", "is_active")
+    list_select_related = ("type",)
+    list_filter = ("type",)
+    search_fields = ("name__exact",)
+
+
+class InventoryAdmin(admin.ModelAdmin):
+    list_display = ("character", "used_slots", "max_space")
+    list_select_related = ("character__user",)
+    raw_id_fields = ("character",)
+    search_fields = (f"character__{USERNAME}",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class ItemAdmin(KeysetPagedAdmin):
+    list_display = ("id", "name", "blueprint", "rarity", "amount", "inventory")
+    list_select_related = ("blueprint", "inventory__character__user")
+    raw_id_fields = ("inventory",)
+    list_filter = ("blueprint",)
+    search_fields = (f"inventory__character__{USERNAME}",)
+
+
+class UserVisitAdmin(KeysetPagedAdmin):
+    list_display = ("id", "user", "method", "url", "view", "last_rolled_view")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = (USERNAME,)
+
+
+class HourlyVisitRollupAdmin(admin.ModelAdmin):
+    list_display = ("hour", "method", "url", "views")
+    search_fields = ("url__exact",)
+    date_hierarchy = "hour"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class DailyVisitRollupAdmin(admin.ModelAdmin):
+    list_display = ("day", "method", "url", "views")
+    search_fields = ("url__exact",)
+    date_hierarchy = "day"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class VisitRollupRunAdmin(admin.ModelAdmin):
+    list_display = ("started_at", "visits", "views")
+
+
+class WalletAdmin(admin.ModelAdmin):
+    list_display = ("character", "gold")
+    list_select_related = ("character__user",)
+    raw_id_fields = ("character",)
+    search_fields = (f"character__{USERNAME}",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class GoldLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ("character", "amount", "reason", "created_at")
+    list_select_related = ("character__user",)
+    raw_id_fields = ("character",)
+    search_fields = (f"character__{USERNAME}",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class LootWeightAdmin(admin.ModelAdmin):
+    list_display = ("location_type", "location", "blueprint", "rarity", "weight")
+    list_select_related = ("location_type", "location", "blueprint")
+    raw_id_fields = ("location",)
+    list_filter = ("location_type",)
 
 
 admin.site.register(Character, CharacterAdmin)
-admin.site.register(CharacterAttributes)
+admin.site.register(CharacterAttributes, CharacterAttributesAdmin)
 admin.site.register(CharacterCooldown, CharacterCooldownAdmin)
 admin.site.register(CharacterSelection, CharacterSelectionAdmin)
 admin.site.register(CharacterLocation, CharacterLocationAdmin)
 admin.site.register(Location, LocationAdmin)
 admin.site.register(LocationType)
 admin.site.register(ItemBlueprint)
-admin.site.register(Item)
-admin.site.register(Inventory)
-admin.site.register(UserVisit)
+admin.site.register(Item, ItemAdmin)
+admin.site.register(Inventory, InventoryAdmin)
+admin.site.register(UserVisit, UserVisitAdmin)
+admin.site.register(HourlyVisitRollup, HourlyVisitRollupAdmin)
+admin.site.register(DailyVisitRollup, DailyVisitRollupAdmin)
+admin.site.register(VisitRollupRun, VisitRollupRunAdmin)
+admin.site.register(LootWeight, LootWeightAdmin)
+admin.site.register(Wallet, WalletAdmin)
+admin.site.register(GoldLedgerEntry, GoldLedgerEntryAdmin)
@@ -0,0 +1,105 @@
+"""Changelist paging for the admin of large tables.
+
+``EstimatedCountPaginator`` takes the row count of an unfiltered table
+from the PostgreSQL planner statistics instead of a ``COUNT(*)`` over
+millions of rows. ``KeysetPagedAdmin`` pages by primary key instead of
+offset: a page is the rows below the ``before`` id of the URL, newest
+first, so a page deep into the table costs the same index range scan as
+the first one and nothing is counted.
+"""
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# below this many estimated rows an exact count is cheap enough
+ESTIMATE_THRESHOLD = 10000
+
+KEYSET_VAR = "before"
+
+
+def estimated_row_count(model, using):
+    """The planner's row estimate of the table of ``model``, None where there is none."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 for a table that was never analyzed
+    if row is None or row[0] < 0:
+        return None
+
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Counts unfiltered large tables by estimate, anything else exactly."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(KEYSET_VAR, None)
+
+        return lookup_params
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        before = self.params.get(KEYSET_VAR)
+        if before is None:
+            self.before = None
+        else:
+            try:
+                self.before = int(before)
+            except ValueError:
+                raise IncorrectLookupParameters
+            queryset = queryset.filter(pk__lt=self.before)
+
+        return queryset.order_by("-pk")
+
+    def get_results(self, request):
+        # one row more than a page tells whether there is an older page
+        rows = list(self.queryset[:self.list_per_page + 1])
+        self.result_list = rows[:self.list_per_page]
+        self.next_before = self.result_list[-1].pk if len(rows) > self.list_per_page else None
+
+        self.result_count = len(self.result_list)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = self.next_before is not None or self.before is not None
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+    @property
+    def newest_url(self):
+        return self.get_query_string(remove=[KEYSET_VAR])
+
+    @property
+    def older_url(self):
+        return self.get_query_string({KEYSET_VAR: self.next_before})
+
+
+class KeysetPagedAdmin(admin.ModelAdmin):
+    """A changelist of the newest rows first, paged by primary key."""
+
+    change_list_template = "admin/wwwhero/keyset_change_list.html"
+    ordering = ("-pk",)
+    sortable_by = ()
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
@@ -0,0 +1,140 @@
+"""Small JSON endpoints for in-place page updates.
+
+Reads are served from the same caches as the pages: the active character
+of the request, the cooldown cache and the inventory snapshot, whose rows
+go out as they are, arrays in ``InventoryRow`` field order. Actions answer
+with their outcome and the parts of the state they changed.
+"""
+import functools
+
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
+
+from wwwhero import actions, cooldowns, dbpool, snapshots
+from wwwhero.models import CharacterCooldown
+from wwwhero.snapshots import InventoryRow
+
+
+def _json(payload, status=200):
+    return JsonResponse(payload, status=status, json_dumps_params={"separators": (",", ":")})
+
+
+def api_view(view):
+    """``login_required`` for the API: errors are JSON, the view gets the active character."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _json({"error": "Authentication required"}, status=401)
+        active = request.active_character
+        if not active:
+            return _json({"error": "No character selected"}, status=404)
+        try:
+            return view(request, active, *args, **kwargs)
+        except Http404 as e:
+            return _json({"error": str(e)}, status=404)
+
+    return wrapper
+
+
+def _character(active):
+    character, attributes, character_location = active.character, active.attributes, active.character_location
+
+    return {
+        "id": character.id,
+        "name": character.name,
+        "level": character.level,
+        "max_level": character.MAX_LEVEL,
+        "attributes": attributes and {
+            "hp": attributes.hp,
+            "max_hp": attributes.max_hp,
+            "dmg": attributes.dmg,
+            "luck": attributes.luck,
+        },
+        "location": character_location and character_location.location.name,
+    }
+
+
+def _cooldowns(character):
+    return {"level": cooldowns.remaining_seconds(character.id, CharacterCooldown.Type.LEVEL)}
+
+
+def _gold(active):
+    return active.wallet.gold if active.wallet else 0
+
+
+def _inventory(inventory, with_items=True):
+    payload = {"used": inventory.used_slots, "max_space": inventory.max_space}
+    if with_items:
+        payload["fields"] = InventoryRow._fields
+        payload["items"] = snapshots.get_rows(inventory.id)
+
+    return payload
+
+
+@dbpool.pooled_view
+@api_view
+def character_state(request, active):
+    return _json({
+        "character": _character(active),
+        "cooldowns": _cooldowns(active.character),
+        "inventory": _inventory(active.inventory, with_items=False),
+        "gold": _gold(active),
+    })
+
+
+@dbpool.pooled_view
+@api_view
+def character_cooldowns(request, active):
+    return _json(_cooldowns(active.character))
+
+
+@dbpool.pooled_view
+@api_view
+def inventory(request, active):
+    return _json(_inventory(active.inventory))
+
+
+def _outcome(outcome, **state):
+    return _json({"ok": outcome.ok, "message": outcome.message, **state}, status=200 if outcome.ok else 409)
+
+
+@require_POST
+@api_view
+def character_level_up(request, active):
+    outcome = actions.level_up(active.character)
+    if outcome.ok:
+        # level_up changes both rows with F() expressions
+        active.inventory.refresh_from_db(fields=["max_space"])
+        if active.attributes:
+            active.attributes.refresh_from_db()
+
+    return _outcome(
+        outcome,
+        character=_character(active),
+        cooldowns=_cooldowns(active.character),
+        inventory=_inventory(active.inventory, with_items=False),
+    )
+
+
+@require_POST
+@api_view
+def character_loot(request, active):
+    try:
+        times = int(request.POST.get("times", 1))
+    except ValueError:
+        return _json({"error": "times must be a number"}, status=400)
+
+    outcome = actions.search(active, times)
+    if outcome.ok and active.wallet:
+        # the search credits the wallet with an F() expression
+        active.wallet.refresh_from_db()
+
+    return _outcome(outcome, inventory=_inventory(active.inventory), gold=_gold(active))
+
+
+@require_POST
+@api_view
+def inventory_drop(request, active, item_id):
+    outcome = actions.drop(active.inventory, item_id, drop_all=bool(request.POST.get("all")))
+
+    return _outcome(outcome, inventory=_inventory(active.inventory))
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class WwwheroConfig(AppConfig):
     name = "wwwhero"
+
+    def ready(self):
+        # connects the signal receivers and registers the checks
+        from wwwhero import catalog, checks, conditional, cooldowns, dbpool, images, locations, loot  # noqa: F401
+
+        if settings.WARM_UP:
+            from wwwhero import warmup
+            warmup.warm_up()
@@ -0,0 +1,119 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Collects records in memory and hands them to ``handler`` in batches.
+
+    A daemon thread flushes the buffer every ``interval()`` seconds, and
+    right away once ``max_size`` records are waiting (``0`` disables the
+    thread, so only explicit and on-exit flushes happen). The thread is
+    started lazily and restarted after a fork, so it is safe to create
+    buffers at import time in a preloaded gunicorn master. ``add()`` never
+    writes itself: the request thread only appends and wakes the flusher.
+
+    The buffer holds at most ``capacity`` records; while it is full, as when
+    the database is down, new records are dropped and counted, and the count
+    is logged once by the next flush.
+
+    A batch the handler fails on is kept for the next flush. After
+    ``max_attempts`` failed flushes in a row it is split and written in
+    halves, and the records that fail on their own are dropped and logged
+    together, so one bad record can't block the buffer forever.
+    """
+
+    def __init__(self, handler, interval, max_size=1000, capacity=10000, max_attempts=3):
+        self._handler = handler
+        self._interval = interval
+        self._max_size = max_size
+        self._capacity = capacity
+        self._max_attempts = max_attempts
+        self._failures = 0
+        self._overflow = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._records = []
+        self._pid = None
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, record):
+        with self._lock:
+            if len(self._records) >= self._capacity:
+                self._overflow += 1
+                return
+            self._records.append(record)
+            full = len(self._records) >= self._max_size
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                records, self._records = self._records, []
+                overflow, self._overflow = self._overflow, 0
+            if overflow:
+                logger.error("Dropped %d records, the buffer was full", overflow)
+            if not records:
+                return
+            try:
+                self._handler(records)
+            except Exception:
+                self._failures += 1
+                if self._failures < self._max_attempts:
+                    logger.exception("Failed to flush %d buffered records", len(records))
+                    with self._lock:
+                        self._records[:0] = records
+                    return
+                logger.exception(
+                    "Failed to flush %d buffered records %d times, writing them apart",
+                    len(records), self._failures,
+                )
+                dropped = self._write_apart(records)
+                if dropped:
+                    logger.error("Dropped %d buffered records the handler failed on: %r", len(dropped), dropped)
+            self._failures = 0
+
+    def _write_apart(self, records):
+        """Write ``records`` in halves, returning the ones that fail on their own."""
+        dropped = []
+        middle = len(records) // 2
+        for half in (records[:middle], records[middle:]):
+            if not half:
+                continue
+            try:
+                self._handler(half)
+            except Exception:
+                if len(half) > 1:
+                    dropped.extend(self._write_apart(half))
+                else:
+                    dropped.extend(half)
+
+        return dropped
+
+    def _ensure_flusher(self):
+        if self._pid == os.getpid() or not self._interval():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._interval() or 1)
+            self._wake.clear()
+            close_old_connections()
+            self.flush()
+            close_old_connections()
@@ -0,0 +1,38 @@
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import F, Q
+
+CHUNK_SIZE = 200
+
+
+def bulk_increment(model, key_fields, counter, increments):
+    """Add ``increments`` ({key tuple: amount}) to ``model.<counter>``.
+
+    Missing rows are inserted with a zero counter first, then one UPDATE
+    per distinct amount (and chunk of keys) bumps the counters, so a flush
+    costs a handful of statements instead of two per key.
+    """
+    if not increments:
+        return
+
+    with transaction.atomic():
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key)), **{counter: 0}) for key in increments],
+            batch_size=CHUNK_SIZE,
+            ignore_conflicts=True,
+        )
+
+        keys_by_amount = defaultdict(list)
+        for key, amount in increments.items():
+            keys_by_amount[amount].append(key)
+
+        for amount, keys in keys_by_amount.items():
+            for start in range(0, len(keys), CHUNK_SIZE):
+                condition = reduce(
+                    operator.or_,
+                    (Q(**dict(zip(key_fields, key))) for key in keys[start:start + CHUNK_SIZE]),
+                )
+                model.objects.filter(condition).update(**{counter: F(counter) + amount})
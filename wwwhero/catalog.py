@@ -0,0 +1,60 @@
+"""Process-local, read-only copy of the ``ItemBlueprint`` table.
+
+The catalog is rebuilt when the ``blueprints`` version changes. Saving or
+deleting a blueprint (admin or ORM) bumps it through signals once the
+transaction commits; bulk operations that skip signals must call
+``invalidate()`` themselves.
+"""
+import random
+from collections import defaultdict
+from types import MappingProxyType
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from wwwhero import versions
+from wwwhero.models import ItemBlueprint
+
+VERSION_NAME = "blueprints"
+
+
+class BlueprintCatalog:
+    __slots__ = ("version", "blueprints", "by_id", "by_name", "by_type")
+
+    def __init__(self, blueprints, version):
+        self.version = version
+        self.blueprints = tuple(blueprints)
+        self.by_id = MappingProxyType({bp.id: bp for bp in self.blueprints})
+        self.by_name = MappingProxyType({bp.name: bp for bp in self.blueprints})
+
+        by_type = defaultdict(list)
+        for bp in self.blueprints:
+            by_type[bp.item_type].append(bp)
+        self.by_type = MappingProxyType({t: tuple(bps) for t, bps in by_type.items()})
+
+    def __len__(self):
+        return len(self.blueprints)
+
+    def choice(self, rng=random):
+        return rng.choice(self.blueprints)
+
+
+_catalog = versions.VersionedValue(
+    VERSION_NAME, lambda version: BlueprintCatalog(ItemBlueprint.objects.order_by("id"), version),
+)
+
+
+def get_catalog():
+    return _catalog.get()
+
+
+def invalidate():
+    versions.bump(VERSION_NAME)
+
+
+@receiver(post_save, sender=ItemBlueprint)
+@receiver(post_delete, sender=ItemBlueprint)
+def _blueprint_changed(**kwargs):
+    # bumped before the commit, another process could cache the old rows under the new version
+    transaction.on_commit(invalidate)
@@ -0,0 +1,37 @@
+"""System checks of the deployment settings.
+
+The version stamps (``wwwhero/versions.py``) behind the in-process
+catalogs, the inventory snapshots and the conditional GETs are kept in
+Django's cache. With a process-local backend a change bumps the stamp of
+one worker only, and the others serve stale pages and catalogs until
+their stamps expire (``settings.VERSION_STAMP_TTL``).
+"""
+import os
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def check_shared_cache(workers):
+    """Warnings when ``workers`` processes would each keep their own version stamps."""
+    backend = settings.CACHES["default"]["BACKEND"]
+    if workers < 2 or backend not in PROCESS_LOCAL_CACHES:
+        return []
+
+    return [Warning(
+        f"{workers} worker processes can't share version stamps through {backend}, "
+        f"a change reaches the other workers only when their stamps expire.",
+        hint="Set CACHE_BACKEND and CACHE_LOCATION to a cache all workers share, e.g. memcached.",
+        id="wwwhero.W001",
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache(app_configs, **kwargs):
+    # gunicorn's default number of workers
+    return check_shared_cache(int(os.getenv("WEB_CONCURRENCY", 1)))
@@ -0,0 +1,145 @@
+"""Conditional GETs for the pages of the selected character.
+
+Every character has a state version stamp (``wwwhero/versions.py``) that is
+bumped whenever something its pages show changes: the character row,
+attributes, location, cooldowns and the inventory through the game
+actions. Every user has one more, bumped when their characters or the
+selection change, for the character list of the index page.
+
+The ETag of a page combines both stamps and the versions of the item,
+location and image catalogs the pages render from with the id of the
+character the page shows, ``request.active_character``, and the CSRF
+secret the page embeds, so a page is validated with the session, the
+user, the active character and five cache reads. The newest stamp, being
+wall-clock time, doubles as ``Last-Modified``. Pages with pending flash messages are never
+answered with a 304.
+
+Stamps are bumped once the changing transaction commits. They live in
+Django's cache; without one shared by all worker processes a worker may
+answer 304 for a change made through another one until the stamps expire
+(see ``wwwhero/checks.py``).
+"""
+import hashlib
+from collections import namedtuple
+
+from django.contrib import messages
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from wwwhero import catalog, images, locations, versions
+from wwwhero.models import (
+    Character,
+    CharacterAttributes,
+    CharacterCooldown,
+    CharacterLocation,
+    CharacterSelection,
+)
+
+Stamps = namedtuple(
+    "Stamps", "character_id character_version user_version catalog_version locations_version images_version",
+)
+
+
+def _character_version_name(character_id):
+    return f"character:{character_id}"
+
+
+def _user_version_name(user_id):
+    return f"user:{user_id}"
+
+
+def touch(character_id=None, user_id=None):
+    """Mark the state of a character and/or the character list of a user as changed."""
+    if character_id is not None:
+        versions.bump(_character_version_name(character_id))
+    if user_id is not None:
+        versions.bump(_user_version_name(user_id))
+
+
+def touch_on_commit(character_id=None, user_id=None):
+    transaction.on_commit(lambda: touch(character_id, user_id))
+
+
+def _stamps(request):
+    if not request.user.is_authenticated or len(messages.get_messages(request)):
+        return None
+    active = request.active_character
+    if not active:
+        return None
+    character_id = active.character.id
+
+    return Stamps(
+        character_id,
+        versions.get(_character_version_name(character_id)),
+        versions.get(_user_version_name(request.user.id)),
+        # the stamps the catalogs are built from, read without loading them
+        versions.get(catalog.VERSION_NAME),
+        versions.get(locations.VERSION_NAME),
+        versions.get(images.VERSION_NAME),
+    )
+
+
+def _etag(request, stamps):
+    # rendering the page may set the CSRF cookie, so this is computed again afterwards
+    key = f"{request.user.id}:{stamps}:{request.META.get('CSRF_COOKIE', '')}"
+
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+def _last_modified(stamps):
+    # every field but the character id is a stamp
+    return int(max(stamps[1:]))
+
+
+def not_modified(request):
+    """Return a 304 response when the client's copy of the page is current, else None."""
+    stamps = _stamps(request)
+    if stamps is None:
+        return None
+    request._state_stamps = stamps
+
+    return get_conditional_response(
+        request,
+        etag=_etag(request, stamps),
+        last_modified=_last_modified(stamps),
+    )
+
+
+def add_validators(request, response):
+    """Send the validators of the stamps read by ``not_modified`` with a rendered page.
+
+    The stamps are the ones from before rendering: a change made meanwhile
+    is caught by the next request.
+    """
+    stamps = getattr(request, "_state_stamps", None)
+    if stamps is not None and response.status_code == 200:
+        response["ETag"] = _etag(request, stamps)
+        response["Last-Modified"] = http_date(_last_modified(stamps))
+        patch_cache_control(response, private=True, no_cache=True)
+
+    return response
+
+
+@receiver(post_save, sender=Character)
+@receiver(post_delete, sender=Character)
+def _character_changed(instance, **kwargs):
+    touch_on_commit(instance.id, instance.user_id)
+
+
+@receiver(post_save, sender=CharacterSelection)
+@receiver(post_delete, sender=CharacterSelection)
+def _selection_changed(instance, **kwargs):
+    touch_on_commit(user_id=instance.user_id)
+
+
+@receiver(post_save, sender=CharacterAttributes)
+@receiver(post_save, sender=CharacterCooldown)
+@receiver(post_save, sender=CharacterLocation)
+@receiver(post_delete, sender=CharacterAttributes)
+@receiver(post_delete, sender=CharacterCooldown)
+@receiver(post_delete, sender=CharacterLocation)
+def _character_state_changed(instance, **kwargs):
+    touch_on_commit(instance.character_id)
@@ -0,0 +1,75 @@
+"""Cooldown lookups served from Django's cache.
+
+The cache maps (character, type) to the cooldown expiry with a TTL equal
+to the remaining time. ``CharacterCooldown`` stays the durable record:
+writes go through to the cache once they commit and a cold cache falls
+back to one query.
+A character without a running cooldown is cached as ``NO_COOLDOWN`` for
+``IDLE_TTL`` seconds.
+"""
+import math
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from wwwhero.models import CharacterCooldown
+
+NO_COOLDOWN = 0
+IDLE_TTL = 300
+
+
+def _key(character_id, type):
+    return f"wwwhero:cooldown:{character_id}:{int(type)}"
+
+
+def get_until(character_id, type):
+    """Return the expiry of a running cooldown or None."""
+    until = cache.get(_key(character_id, type))
+    if until is None:
+        until = CharacterCooldown.objects.filter(
+            character_id=character_id,
+            type=type,
+        ).values_list("until", flat=True).first()
+        remember(character_id, type, until)
+
+    if until and until > timezone.now():
+        return until
+
+    return None
+
+
+def remaining_seconds(character_id, type):
+    until = get_until(character_id, type)
+    if until is None:
+        return 0
+
+    return (until - timezone.now()).seconds + 1  # round to the next second
+
+
+def remember(character_id, type, until):
+    now = timezone.now()
+    if until and until > now:
+        cache.set(_key(character_id, type), until, math.ceil((until - now).total_seconds()))
+    else:
+        cache.set(_key(character_id, type), NO_COOLDOWN, IDLE_TTL)
+
+
+def forget(character_id, type):
+    cache.delete(_key(character_id, type))
+
+
+@receiver(post_save, sender=CharacterCooldown)
+def _cooldown_saved(instance, **kwargs):
+    # readers fall back to the database until the commit, so a rollback
+    # leaves nothing in the cache
+    forget(instance.character_id, instance.type)
+    transaction.on_commit(lambda: remember(instance.character_id, instance.type, instance.until))
+
+
+@receiver(post_delete, sender=CharacterCooldown)
+def _cooldown_deleted(instance, **kwargs):
+    forget(instance.character_id, instance.type)
+    transaction.on_commit(lambda: forget(instance.character_id, instance.type))
@@ -0,0 +1,140 @@
+"""Bounded thread pool for the blocking part of async views.
+
+Under ASGI a sync call made with Django's ``sync_to_async`` runs in one
+thread shared by the whole process, so one slow query stalls every other
+request. ``run`` hands the work to a pool of ``settings.ASYNC_DB_THREADS``
+threads instead: concurrency is bounded by the pool, and so is the number
+of DB connections a worker opens. Pool threads recycle their connections
+around every call, like Django does around a request.
+
+Connections kept open for reuse (``CONN_MAX_AGE``) are checked before a
+request or pooled call runs on them when the database settings have
+``CONN_HEALTH_CHECKS``, a key Django itself only reads from 4.1 on.
+
+With ``ASYNC_DB_THREADS = 0`` the work goes to Django's shared thread and
+``pooled_view`` leaves views sync. That is enough under WSGI, where every
+request already has its own thread, and keeps tests on the connection that
+holds their transaction.
+"""
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import close_old_connections, connections
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    """The pool of this process, ``None`` when it's disabled."""
+    global _executor, _pid
+
+    if not settings.ASYNC_DB_THREADS:
+        return None
+    if _pid != os.getpid():
+        with _lock:
+            if _pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_DB_THREADS,
+                    thread_name_prefix="dbpool",
+                )
+                _pid = os.getpid()
+
+    return _executor
+
+
+def close_connections():
+    """Close the connections of this thread outside of a transaction, e.g. before a fork."""
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def check_connections():
+    """Close the reused connections of this thread that stopped working."""
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and connection.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
+
+
+@receiver(request_started)
+def _check_connections(**kwargs):
+    check_connections()
+
+
+def _recycling_connections(func, *args, **kwargs):
+    close_old_connections()
+    check_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run(func, *args, **kwargs):
+    executor = _get_executor()
+    if executor is None:
+        return await sync_to_async(func)(*args, **kwargs)
+
+    return await sync_to_async(
+        _recycling_connections, thread_sensitive=False, executor=executor,
+    )(func, *args, **kwargs)
+
+
+def _log_errors(func, *args):
+    try:
+        _recycling_connections(func, *args)
+    except Exception:
+        logger.exception("Deferred %s failed", func.__qualname__)
+
+
+def defer(func, *args):
+    """Run ``func`` in the pool without waiting for it, inline when the pool is disabled."""
+    executor = _get_executor()
+    if executor is None:
+        func(*args)
+        return
+
+    executor.submit(_log_errors, func, *args)
+
+
+def spawn(func, *args):
+    """Run ``func`` in a thread of its own without waiting for it.
+
+    For work too slow to hold a pool thread or to run inline, like
+    encoding images; nothing bounds these threads, so keep them rare.
+    """
+    threading.Thread(target=_log_errors, args=(func, *args), daemon=True).start()
+
+
+def pooled_view(view):
+    """Turn a sync view into an async one running in the pool.
+
+    The whole view goes to the pool, not only its queries: sessions,
+    the lazy ``request.user`` and template rendering all touch the DB.
+    Without a pool (WSGI) the view is returned as it is: Django would only
+    run the async view back in a thread of its own for every request.
+    """
+    if not settings.ASYNC_DB_THREADS:
+        return view
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(view, request, *args, **kwargs)
+
+    return wrapper
@@ -4,3 +4,7 @@ class LevelUpCooldownError(Exception):
 
 class MaxLevelError(Exception):
     pass
+
+
+class InventoryFullError(Exception):
+    pass
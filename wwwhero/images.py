@@ -0,0 +1,172 @@
+"""Resized WebP variants of the uploaded images.
+
+Every image of ``IMAGE_FIELDS`` gets a WebP file per configured width,
+named after a hash of the source content and the width, so a name never
+changes its content and the variants are served with far-future,
+immutable cache headers. Saving a new image builds its variants in a
+thread of its own once the save commits, never in the request, and
+``manage.py build_image_variants`` builds the missing ones in bulk;
+which sources have which variants is kept in ``ImageVariants`` and read
+through a process-local catalog, rebuilt when the ``image_variants``
+version changes. Only the variants are served, so an image isn't shown
+until they are built.
+"""
+import hashlib
+import io
+import re
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from PIL import Image, ImageOps
+
+from wwwhero import dbpool, versions
+from wwwhero.models import ImageVariants, Item, Location
+
+VERSION_NAME = "image_variants"
+VARIANT_DIR = "variants"
+VARIANT_NAME = re.compile(r"[0-9a-f]{16}-\d+\.webp")
+WEBP_QUALITY = 80
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# image field and variant widths per model
+IMAGE_FIELDS = {
+    Location: ("image", (640, 1280, 1920)),
+    Item: ("skin", (64, 128)),
+}
+
+Built = namedtuple("Built", "source digest widths")
+
+
+def variant_name(digest, width):
+    return f"{digest}-{width}.webp"
+
+
+def _webp(image, width):
+    variant = image.copy()
+    variant.thumbnail((width, variant.height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    variant.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+
+    return buffer.getvalue()
+
+
+def build_variants(source, widths):
+    """Write the missing variants of the stored image ``source``.
+
+    Touches only the storage, not the database, so it can run in a
+    worker process.
+    """
+    with default_storage.open(source, "rb") as file:
+        data = file.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    for width in widths:
+        name = f"{VARIANT_DIR}/{variant_name(digest, width)}"
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(_webp(image, width)))
+
+    return Built(source, digest, tuple(widths))
+
+
+def record(built):
+    """Store which variants the sources have."""
+    built = list(built)
+    with transaction.atomic():
+        ImageVariants.objects.filter(source__in=[b.source for b in built]).delete()
+        ImageVariants.objects.bulk_create(
+            [ImageVariants(source=b.source, digest=b.digest, widths=list(b.widths)) for b in built],
+            batch_size=500,
+        )
+    invalidate()
+
+
+class VariantCatalog:
+    __slots__ = ("version", "by_source")
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.by_source = MappingProxyType({
+            source: (digest, tuple(sorted(widths))) for source, digest, widths in rows
+        })
+
+
+_catalog = versions.VersionedValue(
+    VERSION_NAME,
+    lambda version: VariantCatalog(ImageVariants.objects.values_list("source", "digest", "widths"), version),
+)
+
+
+def get_variants():
+    return _catalog.get()
+
+
+def invalidate():
+    versions.bump(VERSION_NAME)
+
+
+def _url(digest, width):
+    return reverse("image_variant", kwargs={"name": variant_name(digest, width)})
+
+
+def variant_url(image, width):
+    """URL of the smallest variant at least ``width`` pixels wide, else of the widest.
+
+    Empty for an image without variants.
+    """
+    variants = get_variants().by_source.get(image.name) if image else None
+    if variants is None:
+        return ""
+    digest, widths = variants
+
+    return _url(digest, next((w for w in widths if w >= width), widths[-1]))
+
+
+def srcset(image):
+    """The ``srcset`` attribute value listing all variants of ``image``."""
+    variants = get_variants().by_source.get(image.name) if image else None
+    if variants is None:
+        return ""
+    digest, widths = variants
+
+    return ", ".join(f"{_url(digest, width)} {width}w" for width in widths)
+
+
+@cache_control(public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+def variant_view(request, name):
+    if not VARIANT_NAME.fullmatch(name):
+        raise Http404("No such image")
+    try:
+        file = default_storage.open(f"{VARIANT_DIR}/{name}", "rb")
+    except FileNotFoundError:
+        raise Http404("No such image")
+
+    return FileResponse(file, content_type="image/webp")
+
+
+def _build_and_record(source, widths):
+    record([build_variants(source, widths)])
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Item)
+def _image_saved(sender, instance, update_fields=None, **kwargs):
+    field_name, widths = IMAGE_FIELDS[sender]
+    if update_fields is not None and field_name not in update_fields:
+        return
+    image = getattr(instance, field_name)
+    if not image or image.name in get_variants().by_source:
+        return
+
+    source = image.name
+    transaction.on_commit(lambda: dbpool.spawn(_build_and_record, source, widths))
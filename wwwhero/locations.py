@@ -0,0 +1,49 @@
+"""The locations with their types, read once per ``locations`` version.
+
+Saving or deleting a location or a location type bumps the version on commit.
+"""
+from types import MappingProxyType
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from wwwhero import versions
+from wwwhero.models import Location, LocationType
+
+VERSION_NAME = "locations"
+
+
+class LocationCatalog:
+    __slots__ = ("version", "by_id", "active")
+
+    def __init__(self, locations, version):
+        self.version = version
+        locations = tuple(locations)
+        self.by_id = MappingProxyType({location.id: location for location in locations})
+        self.active = tuple(location for location in locations if location.is_active)
+
+    def unlocked(self, level):
+        return tuple(location for location in self.active if location.min_level <= level)
+
+
+_catalog = versions.VersionedValue(
+    VERSION_NAME,
+    lambda version: LocationCatalog(Location.objects.select_related("type").order_by("min_level", "id"), version),
+)
+
+
+def get_locations():
+    return _catalog.get()
+
+
+def invalidate():
+    versions.bump(VERSION_NAME)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=LocationType)
+@receiver(post_delete, sender=LocationType)
+def _location_changed(**kwargs):
+    transaction.on_commit(invalidate)
@@ -0,0 +1,263 @@
+"""Loot tables and drop formulas.
+
+Every location gets a loot table compiled from the blueprint catalog and
+``LootWeight`` entries into alias samplers, so a drop is O(1) whatever the
+number of blueprints. Tables are cached per process until the catalog or
+the ``loot_weights`` version changes.
+
+All rolls take an ``rng`` (``random.Random`` or the ``random`` module), so a
+seeded stream replays the same drops in tests and benchmarks.
+"""
+import random
+from collections import Counter, namedtuple
+
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from wwwhero import conditional, snapshots, versions, wallet
+from wwwhero.catalog import VERSION_NAME as CATALOG_VERSION_NAME, get_catalog
+from wwwhero.exceptions import InventoryFullError
+from wwwhero.models import GoldLedgerEntry, Inventory, Item, ItemBlueprint, LootWeight
+
+VERSION_NAME = "loot_weights"
+
+DEFAULT_RARITY_WEIGHTS = {
+    Item.Rarity.COMMON: 20,
+    Item.Rarity.UNCOMMON: 10,
+    Item.Rarity.RARE: 5,
+    Item.Rarity.EPIC: 2,
+    Item.Rarity.LEGENDARY: 1,
+}
+
+Drop = namedtuple("Drop", "blueprint rarity level min_damage max_damage cost")
+Found = namedtuple("Found", "name amount")
+
+
+class AliasSampler:
+    """Weighted choice by Vose's alias method: O(n) to build, O(1) to sample."""
+
+    __slots__ = ("outcomes", "_probability", "_alias")
+
+    def __init__(self, weights):
+        weights = {k: w for k, w in weights.items() if w > 0}
+        if not weights:
+            raise ValueError("At least one positive weight is required")
+
+        self.outcomes = tuple(weights)
+        n = len(self.outcomes)
+        total = sum(weights.values())
+        scaled = [weights[k] * n / total for k in self.outcomes]
+        probability = [1.0] * n
+        alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+
+        self._probability = tuple(probability)
+        self._alias = tuple(alias)
+
+    def sample(self, rng=random):
+        i = rng.randrange(len(self.outcomes))
+        if rng.random() >= self._probability[i]:
+            i = self._alias[i]
+
+        return self.outcomes[i]
+
+
+class LootTable:
+    __slots__ = ("blueprints", "rarities")
+
+    def __init__(self, blueprint_weights, rarity_weights):
+        self.blueprints = AliasSampler(blueprint_weights)
+        self.rarities = AliasSampler(rarity_weights)
+
+    def roll(self, location_level, rng=random):
+        blueprint = self.blueprints.sample(rng)
+        rarity = self.rarities.sample(rng)
+        level = rng.randint(location_level - 1, location_level + 1) or 1
+        min_damage, max_damage = 0, 0
+
+        if blueprint.item_type == ItemBlueprint.ItemType.WEAPON:
+            level_plus_rarity = level + rarity
+            min_damage = rng.randint(
+                level_plus_rarity,
+                level * rarity + rng.randint(1, level)
+            )
+            max_damage = rng.randint(
+                min_damage,
+                min_damage + rng.randint(1, level_plus_rarity * 2)
+            )
+
+        return Drop(
+            blueprint=blueprint,
+            rarity=rarity,
+            level=level,
+            min_damage=min_damage,
+            max_damage=max_damage,
+            cost=level * rarity * blueprint.base_cost,
+        )
+
+
+class _LootTables:
+    """Loot tables of one catalog and ``LootWeight`` version."""
+
+    def __init__(self, catalog, loot_weights, version):
+        self.version = version
+        self._catalog = catalog
+        self._weights = {}
+        for entry in loot_weights:
+            scope = ("location", entry.location_id) if entry.location_id \
+                else ("type", entry.location_type_id)
+            self._weights.setdefault(scope, []).append(entry)
+        self._tables = {}
+
+    def table_for(self, location):
+        key = (location.id, location.type_id)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = self._compile(location)
+
+        return table
+
+    def _compile(self, location):
+        blueprint_weights = {bp: 1 for bp in self._catalog.blueprints}
+        rarity_weights = dict(DEFAULT_RARITY_WEIGHTS)
+
+        scopes = [("type", None), ("type", location.type_id), ("location", location.id)]
+        for scope in scopes:
+            for entry in self._weights.get(scope, ()):
+                if entry.rarity:
+                    rarity_weights[Item.Rarity(entry.rarity)] = entry.weight
+                elif entry.blueprint_id in self._catalog.by_id:
+                    blueprint_weights[self._catalog.by_id[entry.blueprint_id]] = entry.weight
+
+        return LootTable(blueprint_weights, rarity_weights)
+
+
+_tables = versions.VersionedValue(
+    (CATALOG_VERSION_NAME, VERSION_NAME),
+    lambda version: _LootTables(get_catalog(), LootWeight.objects.all(), version),
+)
+
+
+def get_loot_table(location):
+    return _tables.get().table_for(location)
+
+
+def roll(location, rng=random):
+    return get_loot_table(location).roll(location.min_level, rng)
+
+
+def roll_gold(character_level, rng=random):
+    return rng.randint(character_level, character_level * 10)
+
+
+def search(character, location, times=1, rng=random, inventory=None):
+    """Roll up to ``times`` drops at ``location`` into the character's inventory.
+
+    The number of drops is capped by the free inventory space, which is
+    reserved up front with one conditional UPDATE; slots left over after
+    merging are given back. Stackable drops are merged in memory and gold
+    goes to the wallet in one credit, so the whole search costs a fixed
+    number of queries whatever ``times`` is. Pass the character's
+    ``inventory`` if it's loaded already; its ``used_slots`` is updated.
+    Returns ``Found`` entries in order of discovery.
+    """
+    table = get_loot_table(location)
+    catalog = get_catalog()
+    # the blueprints that are merged into an existing item
+    stack_ids = [
+        blueprint.id for blueprint in catalog.blueprints
+        if blueprint.is_stackable or blueprint.item_type == ItemBlueprint.ItemType.QUEST
+    ]
+    if inventory is None:
+        inventory = Inventory.objects.only("id", "max_space", "used_slots").get(character=character)
+
+    with transaction.atomic():
+        times = min(times, inventory.max_space - inventory.used_slots)
+        if times < 1 or not inventory.reserve_slots(times):
+            raise InventoryFullError
+        # the reservation locks the inventory row, so no other search
+        # can add the same stacks meanwhile
+        items = list(
+            Item.objects.filter(inventory=inventory, blueprint_id__in=stack_ids).only("id", "blueprint_id", "name")
+        )
+
+        stacks = {item.blueprint_id: item for item in items}
+        increments = Counter()
+        new_items = []
+        found = Counter()
+        gold = 0
+
+        def add_to_stack(blueprint, amount, rarity=Item.Rarity.COMMON):
+            item = stacks.get(blueprint.id)
+            if item is None:
+                item = stacks[blueprint.id] = Item(
+                    inventory=inventory,
+                    blueprint=blueprint,
+                    rarity=rarity,
+                    name=blueprint.name,
+                    amount=0,
+                )
+                new_items.append(item)
+            if item.pk:
+                increments[item.pk] += amount
+            else:
+                item.amount += amount
+            found[item.name] += amount
+
+        for _ in range(times):
+            drop = table.roll(location.min_level, rng)
+            blueprint = drop.blueprint
+            if blueprint.item_type == ItemBlueprint.ItemType.QUEST and blueprint.id not in stacks:
+                add_to_stack(blueprint, 1, rarity=Item.Rarity.LEGENDARY)
+            elif blueprint.item_type in (ItemBlueprint.ItemType.GOLD, ItemBlueprint.ItemType.QUEST):
+                amount = roll_gold(character.level, rng)
+                gold += amount
+                found["gold"] += amount
+            elif blueprint.is_stackable:
+                add_to_stack(blueprint, 1)
+            else:
+                item = Item(
+                    inventory=inventory,
+                    blueprint=blueprint,
+                    min_damage=drop.min_damage,
+                    max_damage=drop.max_damage,
+                    rarity=drop.rarity,
+                    level=drop.level,
+                    cost=drop.cost,
+                )
+                item.generate_name(rng=rng)
+                new_items.append(item)
+                found[item.name] += 1
+
+        if len(new_items) < times:
+            inventory.free_slots(times - len(new_items))
+        Item.objects.bulk_create(new_items)
+        if increments:
+            Item.objects.filter(pk__in=increments).update(amount=F("amount") + Case(
+                *(When(pk=pk, then=amount) for pk, amount in increments.items())
+            ))
+        wallet.credit(character.id, gold, GoldLedgerEntry.Reason.LOOT)
+        snapshots.invalidate_on_commit(inventory.id)
+        conditional.touch_on_commit(character.id)
+
+    return [Found(name, amount) for name, amount in found.items()]
+
+
+def invalidate():
+    versions.bump(VERSION_NAME)
+
+
+@receiver(post_save, sender=LootWeight)
+@receiver(post_delete, sender=LootWeight)
+def _loot_weight_changed(**kwargs):
+    transaction.on_commit(invalidate)
@@ -0,0 +1,266 @@
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from wwwhero import visits
+from wwwhero.models import (
+    Character,
+    CharacterAttributes,
+    CharacterLocation,
+    CharacterSelection,
+    Inventory,
+    Location,
+    LocationType,
+    User,
+)
+
+GAME_PAGES = ("index", "map", "story", "character_detail")
+SESSION_MODES = ("db", "cached_db", "signed_cookies")
+# CONN_MAX_AGE and CONN_HEALTH_CHECKS of the connection modes
+CONNECTION_MODES = {
+    "reconnect": (0, False),
+    "persistent": (600, False),
+    "checked": (600, True),
+}
+# anonymous pages, they render templates without touching the database
+STARTUP_PAGES = ("index", "login")
+STARTUP_RUNS = 3
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.test import Client
+setup = time.perf_counter() - start
+client = Client()
+requests = []
+for path in sys.argv[1:]:
+    start = time.perf_counter()
+    client.get(path)
+    requests.append(time.perf_counter() - start)
+print(json.dumps({"setup": setup, "requests": requests}))
+"""
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the benchmark inside a transaction that is never committed."""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def make_player(username="benchmark-player"):
+    user = User.objects.create_user(username=username, password="benchmark!1")
+    character = Character.objects.create(user=user, name="Bench")
+    CharacterAttributes.objects.create(character=character)
+    Inventory.objects.create(character=character)
+    CharacterSelection.objects.create(user=user, character=character)
+    location_type, _ = LocationType.objects.get_or_create(name="benchmark")
+    location = Location.objects.create(
+        name=f"{username} land", type=location_type, is_active=True
+    )
+    CharacterLocation.objects.create(character=character, location=location)
+
+    return user, character
+
+
+def logged_in_client(user):
+    client = Client()
+    client.force_login(user)
+
+    return client
+
+
+def count_queries(client, urls):
+    with CaptureQueriesContext(connection) as ctx:
+        for url in urls:
+            client.get(url)
+
+    return len(ctx.captured_queries)
+
+
+def bench_visits(command, requests):
+    urls = [reverse(name) for name in itertools.islice(itertools.cycle(GAME_PAGES), requests)]
+    results = {}
+
+    with rolled_back():
+        user, _ = make_player()
+        for mode in (visits.SYNC, visits.BUFFERED):
+            with override_settings(VISIT_COUNTER_MODE=mode, VISIT_COUNTER_FLUSH_INTERVAL=0):
+                visits.flush()
+                client = logged_in_client(user)
+                queries = count_queries(client, urls)
+                with CaptureQueriesContext(connection) as ctx:
+                    visits.flush()
+                results[mode] = queries + len(ctx.captured_queries)
+
+    command.report(requests, results, baseline=visits.SYNC)
+
+
+def game_round(character, location):
+    """The URLs of a round of play: select, travel, search and level up."""
+    return (
+        reverse("character_select", kwargs={"character_id": character.id}),
+        reverse("map"),
+        reverse("location_select", kwargs={"location_id": location.id}),
+        reverse("story"),
+        reverse("character_loot"),
+        reverse("character_detail"),
+        reverse("character_level_up"),
+        reverse("index"),
+    )
+
+
+def session_settings(mode):
+    """The settings ``SESSION_MODE=<mode>`` stands for."""
+    overrides = {"SESSION_ENGINE": f"django.contrib.sessions.backends.{mode}"}
+    if mode != "db":
+        overrides["MESSAGE_STORAGE"] = "django.contrib.messages.storage.cookie.CookieStorage"
+
+    return override_settings(**overrides)
+
+
+def bench_sessions(command, requests):
+    results = {}
+
+    with rolled_back(), override_settings(VISIT_COUNTER_MODE=visits.BUFFERED, VISIT_COUNTER_FLUSH_INTERVAL=0):
+        for mode in SESSION_MODES:
+            # a fresh player per mode, so every mode plays the same rounds
+            user, character = make_player(username=f"benchmark-{mode}")
+            location = CharacterLocation.objects.get(character=character).location
+            urls = itertools.islice(itertools.cycle(game_round(character, location)), requests)
+            with session_settings(mode):
+                results[mode] = count_queries(logged_in_client(user), urls)
+            visits.flush()
+
+    command.report(requests, results, baseline=SESSION_MODES[0])
+
+
+@contextmanager
+def connection_settings(max_age, health_checks):
+    """Reopen the default connection with other reuse settings."""
+    saved = {key: connection.settings_dict.get(key) for key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS")}
+    connection.close()
+    connection.settings_dict.update(CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks)
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.settings_dict.update(saved)
+
+
+def bench_connections(command, requests):
+    """Milliseconds per request of a request cycle with one small query.
+
+    Runs outside of a transaction and the test client, which keep the
+    connection open, so Django closes or keeps it like in production.
+    """
+    if connection.in_atomic_block:
+        raise CommandError("The connections scenario can't run inside a transaction")
+    results = {}
+    opened = []
+
+    def count(**kwargs):
+        opened.append(1)
+
+    connection_created.connect(count)
+    try:
+        for mode, (max_age, health_checks) in CONNECTION_MODES.items():
+            opened.clear()
+            with connection_settings(max_age, health_checks):
+                start = time.perf_counter()
+                for _ in range(requests):
+                    request_started.send(sender=None, environ={})
+                    Location.objects.filter(is_active=True).exists()
+                    request_finished.send(sender=None)
+                results[mode] = round((time.perf_counter() - start) * 1000, 1)
+            command.stdout.write(f"{mode:>14}: {len(opened)} connections opened")
+    finally:
+        connection_created.disconnect(count)
+
+    command.report(requests, results, baseline="reconnect", unit="ms")
+
+
+def start_process(warm_up, paths):
+    """Time the setup and the requests of a fresh Python process, in seconds."""
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "buildHeroProject.settings"),
+        WARM_UP="1" if warm_up else "0",
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, *paths],
+        cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, check=True,
+    ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+def bench_startup(command, requests):
+    """Startup and first request times of new processes without and with the warm-up."""
+    pages = [reverse(name) for name in STARTUP_PAGES]
+    paths = list(itertools.islice(itertools.cycle(pages), max(requests, 2 * len(pages))))
+    first = len(pages)
+    results = {}
+
+    for mode, warm_up in (("cold", False), ("warmed up", True)):
+        runs = [start_process(warm_up, paths) for _ in range(STARTUP_RUNS)]
+        setup = sum(run["setup"] for run in runs) / STARTUP_RUNS * 1000
+        first_requests = sum(sum(run["requests"][:first]) for run in runs) / STARTUP_RUNS * 1000
+        later = sum(sum(run["requests"][first:]) for run in runs) / STARTUP_RUNS * 1000
+        results[mode] = round(first_requests, 1)
+        command.stdout.write(
+            f"{mode:>14}: setup {setup:7.1f} ms, first {first} requests {first_requests:7.1f} ms, "
+            f"later ones {later / (len(paths) - first):5.2f} ms each"
+        )
+
+    command.report(first, results, baseline="cold", unit="ms in the first requests")
+
+
+SCENARIOS = {
+    "connections": bench_connections,
+    "sessions": bench_sessions,
+    "startup": bench_startup,
+    "visits": bench_visits,
+}
+
+
+class Command(BaseCommand):
+    help = "Compare DB queries (or time) per request of the optional performance modes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(SCENARIOS))
+        parser.add_argument("--requests", type=int, default=100)
+
+    def handle(self, *args, **options):
+        SCENARIOS[options["scenario"]](self, options["requests"])
+
+    def report(self, requests, results, baseline, unit="queries"):
+        base = results[baseline] / requests
+        for mode, total in results.items():
+            per_request = total / requests
+            self.stdout.write(
+                f"{mode:>14}: {total:8.6g} {unit}, {per_request:6.2f} per request, "
+                f"{base - per_request:+6.2f} saved per request"
+            )
@@ -0,0 +1,58 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from wwwhero import dbpool, images
+from wwwhero.models import ImageVariants
+
+Failed = namedtuple("Failed", "source error")
+
+
+def _setup_worker():
+    # a no-op for forked workers, spawned ones start without Django
+    django.setup()
+
+
+def _build(task):
+    try:
+        return images.build_variants(*task)
+    except Exception as exc:
+        # the message only, the exception may not pickle back from a worker
+        return Failed(task[0], f"{type(exc).__name__}: {exc}")
+
+
+class Command(BaseCommand):
+    help = "Build the resized WebP variants of the uploaded images that have none yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Worker processes, 1 builds inline.")
+        parser.add_argument("--force", action="store_true", help="Rebuild the variants of every image.")
+
+    def handle(self, *args, **options):
+        known = set() if options["force"] else set(ImageVariants.objects.values_list("source", flat=True))
+        tasks = {}
+        for model, (field_name, widths) in images.IMAGE_FIELDS.items():
+            sources = model.objects.exclude(**{field_name: ""}).values_list(field_name, flat=True).distinct()
+            for source in sources.iterator():
+                if source not in known:
+                    tasks.setdefault(source, widths)
+
+        if options["processes"] > 1 and len(tasks) > 1:
+            # forked workers must not share the connections of this process
+            dbpool.close_connections()
+            with ProcessPoolExecutor(max_workers=options["processes"], initializer=_setup_worker) as executor:
+                results = list(executor.map(_build, tasks.items(), chunksize=8))
+        else:
+            results = [_build(task) for task in tasks.items()]
+
+        built = [result for result in results if isinstance(result, images.Built)]
+        failed = [result for result in results if isinstance(result, Failed)]
+        images.record(built)
+        self.stdout.write(f"{len(built)} images got variants")
+        for result in failed:
+            self.stderr.write(f"{result.source}: {result.error}")
+        if failed:
+            raise CommandError(f"{len(failed)} images failed")
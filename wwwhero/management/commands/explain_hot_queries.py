@@ -0,0 +1,140 @@
+import random
+import re
+from collections import namedtuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from wwwhero.management.commands.benchmark import rolled_back
+from wwwhero.models import (
+    Character,
+    CharacterCooldown,
+    CharacterSelection,
+    Inventory,
+    Item,
+    ItemBlueprint,
+    User,
+    UserVisit,
+)
+from wwwhero.snapshots import ITEM_FIELDS
+
+HotQuery = namedtuple("HotQuery", "name build")
+Sample = namedtuple("Sample", "user character inventory stack_ids")
+
+# the shapes of the queries behind the game pages and actions, keep them in
+# sync with the modules named in the comments
+HOT_QUERIES = (
+    # views.index
+    HotQuery("character list", lambda s: Character.objects.filter(user=s.user).order_by("-updated_at")),
+    # middleware.load_active_character
+    HotQuery("active character", lambda s: Inventory.objects.select_related(
+        "character__characterattributes",
+        "character__characterlocation__location",
+        "character__wallet",
+    ).filter(character__characterselection__user=s.user)[:1]),
+    # snapshots.rebuild
+    HotQuery("inventory listing", lambda s: Item.objects.filter(
+        inventory_id=s.inventory.id,
+    ).order_by("id").values_list(*ITEM_FIELDS)),
+    # loot.search
+    HotQuery("inventory stacks", lambda s: Item.objects.filter(
+        inventory=s.inventory, blueprint_id__in=s.stack_ids,
+    ).only("id", "blueprint_id", "name")),
+    # cooldowns.get_until
+    HotQuery("cooldown", lambda s: CharacterCooldown.objects.filter(
+        character_id=s.character.id, type=CharacterCooldown.Type.LEVEL,
+    ).values_list("until", flat=True)[:1]),
+    # visits.count_visit
+    HotQuery("visit counter", lambda s: UserVisit.objects.filter(user=s.user, url="/", method="GET")),
+)
+
+# plan lines reading a whole table, per database vendor
+SEQUENTIAL_SCANS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (?:TABLE )?(?!CONSTANT\b)(\w+)"),
+}
+
+
+def make_data(players, items_per_player, rng):
+    """Fill the tables the hot queries read with ``players`` complete players."""
+    now = timezone.now()
+    prefix = f"explain-{rng.getrandbits(32):08x}-"
+    blueprints = list(ItemBlueprint.objects.all())
+    User.objects.bulk_create([User(username=f"{prefix}{i}", password="!") for i in range(players)])
+    users = list(User.objects.filter(username__startswith=prefix).order_by("id"))
+    Character.objects.bulk_create([
+        Character(user=user, name=f"hero {n}", level=rng.randint(1, 20), updated_at=now)
+        for user in users for n in range(3)
+    ])
+    characters = list(Character.objects.filter(user__in=users).order_by("id"))
+    Inventory.objects.bulk_create([Inventory(character=character) for character in characters])
+    inventories = list(Inventory.objects.filter(character__in=characters).order_by("id"))
+    CharacterSelection.objects.bulk_create([
+        CharacterSelection(user_id=character.user_id, character=character) for character in characters[::3]
+    ])
+    CharacterCooldown.objects.bulk_create([
+        CharacterCooldown(character=character, type=CharacterCooldown.Type.LEVEL, until=now)
+        for character in characters
+    ])
+    UserVisit.objects.bulk_create([
+        UserVisit(user=user, url=url, method="GET", view=1)
+        for user in users for url in ("/", "/character/", "/map/", "/story/")
+    ])
+    Item.objects.bulk_create(
+        [
+            Item(
+                inventory=inventory if rng.random() < 0.8 else None,
+                blueprint=rng.choice(blueprints),
+                rarity=Item.Rarity.COMMON,
+            )
+            for inventory in inventories for _ in range(items_per_player)
+        ],
+        batch_size=500,
+    )
+
+    stack_ids = [blueprint.id for blueprint in blueprints if blueprint.is_stackable]
+
+    return Sample(users[0], characters[0], inventories[0], stack_ids or [blueprints[0].id])
+
+
+def analyze(models):
+    """Refresh the planner statistics of the tables of ``models``."""
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the hot queries over generated data and flag sequential scans. "
+        "The data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=200)
+        parser.add_argument("--items", type=int, default=20, help="Items per character.")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        scans = SEQUENTIAL_SCANS.get(connection.vendor)
+        if scans is None:
+            self.stderr.write(f"Sequential scans aren't detected on {connection.vendor}, only showing plans.")
+        flagged = []
+
+        with rolled_back():
+            sample = make_data(options["players"], options["items"], random.Random(options["seed"]))
+            analyze([Character, CharacterCooldown, CharacterSelection, Inventory, Item, UserVisit])
+
+            for query in HOT_QUERIES:
+                plan = query.build(sample).explain()
+                tables = sorted(set(scans.findall(plan))) if scans else []
+                if tables:
+                    flagged.append(query.name)
+                status = f"SEQUENTIAL SCAN on {', '.join(tables)}" if tables else "ok"
+                self.stdout.write(f"{query.name}: {status}")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if flagged:
+            raise CommandError(f"Sequential scans in: {', '.join(flagged)}")
@@ -0,0 +1,337 @@
+import functools
+import http.cookiejar
+import json
+import math
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from wwwhero.models import User
+
+PASSWORD = "Tr0ub4dor&3-horse"
+LOCATION_LINK = re.compile(r'href="/locations/(\d+)/"')
+DROP_LINK = re.compile(r'href="/inventory/drop/(\d+)/"')
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class Response:
+    __slots__ = ("status", "location", "body", "queries")
+
+    def __init__(self, status, location, body, server_timing=""):
+        self.status = status
+        self.location = location
+        self.body = body
+        queries = SERVER_TIMING_QUERIES.search(server_timing or "")
+        self.queries = int(queries.group(1)) if queries else None
+
+
+class InProcessSession:
+    """Talks to the WSGI application in this process and counts its queries."""
+
+    counts_queries = True
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data=None):
+        response = getattr(self.client, method)(path, data or {})
+
+        return Response(response.status_code, response.get("Location", ""), response.content.decode())
+
+
+class InProcessAsgiSession:
+    """Talks to the ASGI application in this process, query counts come from its Server-Timing header."""
+
+    counts_queries = False
+
+    def __init__(self):
+        self.client = AsyncClient()
+
+    def request(self, method, path, data=None):
+        response = async_to_sync(self._request)(method, path, data)
+
+        return Response(
+            response.status_code,
+            response.get("Location", ""),
+            response.content.decode(),
+            response.get("Server-Timing"),
+        )
+
+    async def _request(self, method, path, data):
+        if method == "post":
+            # the multipart body AsyncClient builds by default can't be read back in Django 3.2
+            return await self.client.post(
+                path, urllib.parse.urlencode(data or {}), content_type="application/x-www-form-urlencoded",
+            )
+
+        return await self.client.get(path, data or {})
+
+
+class HttpSession:
+    """Talks to a running server, query counts come from its Server-Timing header."""
+
+    counts_queries = False
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, target):
+        self.target = target.rstrip("/")
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies),
+            self._NoRedirect,
+        )
+
+    def request(self, method, path, data=None):
+        body, headers = None, {}
+        if method == "post":
+            body = urllib.parse.urlencode(data or {}).encode()
+            csrf = next((c.value for c in self.cookies if c.name == "csrftoken"), "")
+            headers = {"X-CSRFToken": csrf, "Referer": self.target + path}
+        request = urllib.request.Request(self.target + path, data=body, headers=headers)
+        try:
+            response = self.opener.open(request)
+        except urllib.error.HTTPError as error:
+            response = error
+        with response:
+            return Response(
+                response.status,
+                response.headers.get("Location", ""),
+                response.read().decode(),
+                response.headers.get("Server-Timing"),
+            )
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, latency, queries, failed):
+        with self._lock:
+            self.latencies[name].append(latency)
+            if queries is not None:
+                self.queries[name].append(queries)
+            if failed:
+                self.errors[name] += 1
+
+
+def percentile(values, p):
+    values = sorted(values)
+
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class Player:
+    def __init__(self, session, recorder, username):
+        self.session = session
+        self.recorder = recorder
+        self.username = username
+
+    def call(self, name, method="get", data=None, **kwargs):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            if self.session.counts_queries:
+                with connection.execute_wrapper(count):
+                    response = self.session.request(method, reverse(name, kwargs=kwargs), data)
+            else:
+                response = self.session.request(method, reverse(name, kwargs=kwargs), data)
+        except Exception:
+            response = Response(599, "", "")
+        latency = time.perf_counter() - start
+
+        self.recorder.record(
+            name,
+            latency,
+            len(queries) if self.session.counts_queries else response.queries,
+            response.status >= 400,
+        )
+
+        return response
+
+    def play(self, iterations):
+        self.call("signup")
+        self.call("signup", "post", {
+            "username": self.username, "password1": PASSWORD, "password2": PASSWORD,
+        })
+        self.call("character_create")
+        created = self.call("character_create", "post", {"name": "Hero"})
+        character_id = re.search(r"/characters/(\d+)/", created.location)
+        if not character_id:
+            return
+        self.call("character_select", character_id=int(character_id.group(1)))
+
+        for _ in range(iterations):
+            locations = LOCATION_LINK.findall(self.call("map").body)
+            if locations:
+                self.call("location_select", location_id=int(locations[0]))
+            self.call("story")
+            self.call("character_loot")
+            self.call("character_level_up")
+            drops = DROP_LINK.findall(self.call("character_detail").body)
+            if drops:
+                self.call("inventory_drop", item_id=int(drops[0]))
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate concurrent players going through signup, character creation, "
+        "map, loot, level up and drop, and report latency per URL name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=10)
+        parser.add_argument("--iterations", type=int, default=5, help="Game loops per player.")
+        parser.add_argument("--concurrency", type=int, default=None, help="Threads, defaults to players.")
+        parser.add_argument(
+            "--target",
+            help="Base URL of a running server. Without it requests go to the "
+                 "in-process WSGI application against the configured database.",
+        )
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Send in-process requests through the ASGI handler instead of WSGI.",
+        )
+        parser.add_argument(
+            "--db-threads",
+            type=int,
+            default=8,
+            help="ASYNC_DB_THREADS for --asgi runs, 0 uses Django's shared sync thread.",
+        )
+        parser.add_argument("--label", default="", help="Stored in the results, e.g. the mode under test.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument("--compare", help="JSON results of an earlier run to compare against.")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the created users afterwards.")
+
+    def handle(self, *args, **options):
+        players = options["players"]
+        concurrency = options["concurrency"] or players
+        if players < 1 or concurrency < 1:
+            raise CommandError("--players and --concurrency must be positive")
+
+        if options["target"]:
+            make_session = functools.partial(HttpSession, options["target"])
+        elif options["asgi"]:
+            make_session = InProcessAsgiSession
+        else:
+            make_session = InProcessSession
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        prefix = f"loadtest-{time.time_ns()}-"
+        recorder = Recorder()
+
+        def run(i):
+            Player(make_session(), recorder, f"{prefix}{i}").play(options["iterations"])
+
+        def run_in_thread(i):
+            try:
+                run(i)
+            finally:
+                connections.close_all()
+
+        db_threads = options["db_threads"] if options["asgi"] else 0
+        start = time.perf_counter()
+        with override_settings(ASYNC_DB_THREADS=db_threads):
+            if concurrency == 1:
+                for i in range(players):
+                    run(i)
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    list(pool.map(run_in_thread, range(players)))
+        duration = time.perf_counter() - start
+
+        results = self.summarize(recorder, duration, options)
+        self.print_results(results)
+        if baseline:
+            self.print_comparison(baseline, results)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+        if options["cleanup"] and not options["target"]:
+            User.objects.filter(username__startswith=prefix).delete()
+
+    def summarize(self, recorder, duration, options):
+        urls = {}
+        for name, latencies in sorted(recorder.latencies.items()):
+            queries = recorder.queries.get(name)
+            urls[name] = {
+                "requests": len(latencies),
+                "errors": recorder.errors[name],
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+            }
+        requests = sum(url["requests"] for url in urls.values())
+
+        return {
+            "label": options["label"],
+            "target": options["target"] or ("in-process asgi" if options["asgi"] else "in-process"),
+            "players": options["players"],
+            "iterations": options["iterations"],
+            "duration_s": round(duration, 3),
+            "requests": requests,
+            "errors": sum(url["errors"] for url in urls.values()),
+            "throughput_rps": round(requests / duration, 2) if duration else None,
+            "urls": urls,
+        }
+
+    def print_results(self, results):
+        self.stdout.write(
+            f"{results['requests']} requests in {results['duration_s']}s, "
+            f"{results['throughput_rps']} req/s, {results['errors']} errors"
+        )
+        self.stdout.write(
+            f"{'url name':<22}{'count':>7}{'errors':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+        )
+        for name, url in results["urls"].items():
+            queries = url["queries_per_request"]
+            self.stdout.write(
+                f"{name:<22}{url['requests']:>7}{url['errors']:>7}{url['p50_ms']:>9}"
+                f"{url['p95_ms']:>9}{url['p99_ms']:>9}{'-' if queries is None else queries:>9}"
+            )
+
+    def print_comparison(self, baseline, results):
+        def name(run):
+            return run["label"] or run["target"]
+
+        self.stdout.write(
+            f"\n{name(baseline)} -> {name(results)}: "
+            f"{baseline['throughput_rps']} -> {results['throughput_rps']} req/s"
+        )
+        self.stdout.write(f"{'url name':<22}{'p50 ms':>20}{'p95 ms':>20}")
+        for url_name, url in results["urls"].items():
+            before = baseline["urls"].get(url_name)
+            if before is None:
+                continue
+            self.stdout.write(
+                f"{url_name:<22}"
+                f"{before['p50_ms']:>9} -> {url['p50_ms']:<7}"
+                f"{before['p95_ms']:>9} -> {url['p95_ms']:<7}"
+            )
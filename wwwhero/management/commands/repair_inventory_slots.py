@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from wwwhero import conditional
+from wwwhero.models import Inventory, Item
+
+
+def counted_slots():
+    items = Item.objects.filter(inventory=OuterRef("pk")).order_by().values("inventory")
+
+    return Coalesce(Subquery(items.annotate(count=Count("id")).values("count")), 0)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the used slot counters of inventories from their items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report the wrong counters.")
+
+    def handle(self, *args, **options):
+        wrong = Inventory.objects.annotate(counted=counted_slots()).exclude(used_slots=F("counted"))
+        rows = list(wrong.values_list("id", "character_id", "used_slots", "counted"))
+        for inventory_id, _, used_slots, counted in rows:
+            self.stdout.write(f"inventory {inventory_id}: {used_slots} used slots, {counted} items")
+
+        if rows and not options["dry_run"]:
+            Inventory.objects.filter(pk__in=[row[0] for row in rows]).update(used_slots=counted_slots())
+            for _, character_id, *_ in rows:
+                conditional.touch(character_id)
+
+        self.stdout.write(f"{len(rows)} inventories {'to repair' if options['dry_run'] else 'repaired'}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from wwwhero import rollups
+
+
+class Command(BaseCommand):
+    help = "Add the page views counted since the last run to the hourly and daily visit rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=rollups.CHUNK_SIZE,
+            help="Visit counters read and rolled up per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        result = rollups.roll_up(now, chunk_size=options["chunk_size"])
+
+        if rollups.skips_hours(result.previous_run, now):
+            self.stderr.write(
+                f"The previous run was at {result.previous_run:%Y-%m-%d %H:%M}, the views of the hours "
+                f"since are all in the bucket of {now:%Y-%m-%d %H}:00. Run the command every hour."
+            )
+        self.stdout.write(f"{result.views} views of {result.visits} visit counters rolled up")
@@ -0,0 +1,60 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.functional import SimpleLazyObject
+
+from wwwhero.models import Inventory
+
+
+class ActiveCharacter:
+    """The selected character of a user with everything the views need."""
+
+    __slots__ = ("character", "attributes", "inventory", "character_location", "wallet")
+
+    def __init__(self, inventory=None):
+        self.inventory = inventory
+        self.character = inventory.character if inventory else None
+        self.attributes = _related_or_none(self.character, "characterattributes")
+        self.character_location = _related_or_none(self.character, "characterlocation")
+        self.wallet = _related_or_none(self.character, "wallet")
+
+    def __bool__(self):
+        return self.character is not None
+
+
+def _related_or_none(obj, name):
+    try:
+        return getattr(obj, name)
+    except (AttributeError, ObjectDoesNotExist):
+        return None
+
+
+def load_active_character(user):
+    """Load the selected character, its attributes, inventory, location and wallet in one query."""
+    if not user.is_authenticated:
+        return ActiveCharacter()
+
+    inventory = Inventory.objects.select_related(
+        "character__characterattributes",
+        "character__characterlocation__location",
+        "character__wallet",
+    ).filter(character__characterselection__user=user).first()
+
+    return ActiveCharacter(inventory)
+
+
+class ActiveCharacterMiddleware:
+    """Adds a lazy ``request.active_character``, loaded on first access."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            # __call__ then returns the awaitable of get_response
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.active_character = SimpleLazyObject(lambda: load_active_character(request.user))
+
+        return self.get_response(request)
@@ -3,13 +3,16 @@
 from django.db import migrations, models
 import django.db.models.deletion
 
-from wwwhero.models import Character, Inventory, ItemBlueprint
+# Historical models only: the live ones gain fields in later migrations.
+ITEM_TYPE_GOLD = 3
+SLOT_TYPE_INVENTORY = 7
 
 
 def create_gold(apps, schema_editor):
+    ItemBlueprint = apps.get_model("wwwhero", "ItemBlueprint")
     ItemBlueprint.objects.create(
-        item_type=ItemBlueprint.ItemType.GOLD,
-        slot_type=ItemBlueprint.SlotType.INVENTORY,
+        item_type=ITEM_TYPE_GOLD,
+        slot_type=SLOT_TYPE_INVENTORY,
         is_stackable=True,
         name="gold",
         description="Shiny coins!",
@@ -17,11 +20,14 @@ def create_gold(apps, schema_editor):
 
 
 def init_inventory(apps, schema_editor):
+    Character = apps.get_model("wwwhero", "Character")
+    Inventory = apps.get_model("wwwhero", "Inventory")
+    default_space = Inventory._meta.get_field("max_space").default
     chars = Character.objects.all()
     for ch in chars:
         Inventory.objects.create(
             character=ch,
-            max_space=Inventory.max_space.field.default + ch.level - 1
+            max_space=default_space + ch.level - 1
         )
 
 
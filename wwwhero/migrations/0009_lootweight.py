@@ -0,0 +1,25 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wwwhero', '0008_auto_20210920_1112'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LootWeight',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rarity', models.PositiveSmallIntegerField(blank=True, choices=[(1, 'Common'), (2, 'Uncommon'), (3, 'Rare'), (4, 'Epic'), (5, 'Legendary')], null=True)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('blueprint', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='wwwhero.itemblueprint')),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='wwwhero.location')),
+                ('location_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='wwwhero.locationtype')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_used_slots(apps, schema_editor):
+    Inventory = apps.get_model("wwwhero", "Inventory")
+    Item = apps.get_model("wwwhero", "Item")
+    items = Item.objects.filter(inventory=OuterRef("pk")).order_by().values("inventory")
+    Inventory.objects.update(used_slots=Coalesce(
+        Subquery(items.annotate(count=Count("id")).values("count")), 0,
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wwwhero', '0009_lootweight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='used_slots',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(count_used_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Count, F, Sum
+
+ITEM_TYPE_GOLD = 3
+REASON_OPENING_BALANCE = 2
+
+
+def move_gold_to_wallets(apps, schema_editor):
+    """Gold item stacks become wallet balances and free their inventory slots."""
+    Character = apps.get_model("wwwhero", "Character")
+    GoldLedgerEntry = apps.get_model("wwwhero", "GoldLedgerEntry")
+    Inventory = apps.get_model("wwwhero", "Inventory")
+    Item = apps.get_model("wwwhero", "Item")
+    Wallet = apps.get_model("wwwhero", "Wallet")
+
+    gold_items = Item.objects.filter(blueprint__item_type=ITEM_TYPE_GOLD, inventory__isnull=False)
+    balances = dict(
+        gold_items.values("inventory__character").annotate(gold=Sum("amount"))
+        .values_list("inventory__character", "gold")
+    )
+    Wallet.objects.bulk_create(
+        [Wallet(character_id=pk, gold=balances.get(pk, 0)) for pk in Character.objects.values_list("pk", flat=True)],
+        batch_size=500,
+    )
+    GoldLedgerEntry.objects.bulk_create(
+        [
+            GoldLedgerEntry(character_id=pk, amount=gold, reason=REASON_OPENING_BALANCE)
+            for pk, gold in balances.items() if gold
+        ],
+        batch_size=500,
+    )
+
+    slots = gold_items.values("inventory").annotate(count=Count("id")).values_list("inventory", "count")
+    for inventory_id, count in slots:
+        Inventory.objects.filter(pk=inventory_id).update(used_slots=F("used_slots") - count)
+    gold_items.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wwwhero', '0010_inventory_used_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Wallet',
+            fields=[
+                ('character', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='wwwhero.character')),
+                ('gold', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GoldLedgerEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.BigIntegerField()),
+                ('reason', models.PositiveSmallIntegerField(choices=[(1, 'Loot'), (2, 'Opening balance')])),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wwwhero.character')),
+            ],
+        ),
+        migrations.RunPython(move_gold_to_wallets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wwwhero', '0011_wallet'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='charactercooldown',
+            unique_together={('character', 'type')},
+        ),
+        migrations.AddIndex(
+            model_name='character',
+            index=models.Index(fields=['user', '-updated_at'], name='character_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('inventory__isnull', False)), fields=['inventory', 'blueprint'], name='item_stack_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('inventory__isnull', False)), fields=['inventory', 'id'], name='item_inventory_list_idx'),
+        ),
+        # the plain inventory index goes once the partial ones cover it
+        migrations.AlterField(
+            model_name='item',
+            name='inventory',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='wwwhero.inventory'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['min_level', 'id'], name='location_active_level_idx'),
+        ),
+    ]
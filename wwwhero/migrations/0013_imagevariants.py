@@ -0,0 +1,24 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wwwhero', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariants',
+            fields=[
+                ('source', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('digest', models.CharField(max_length=16)),
+                ('widths', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name_plural': 'Image variants',
+            },
+        ),
+    ]
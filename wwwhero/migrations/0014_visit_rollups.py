@@ -0,0 +1,62 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:59
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_views_rolled(apps, schema_editor):
+    """Views counted before the rollups have no time, the rollups start empty."""
+    UserVisit = apps.get_model("wwwhero", "UserVisit")
+    UserVisit.objects.update(last_rolled_view=F("view"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wwwhero', '0013_imagevariants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVisitRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=200)),
+                ('method', models.CharField(max_length=8)),
+                ('views', models.BigIntegerField(default=0)),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyVisitRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=200)),
+                ('method', models.CharField(max_length=8)),
+                ('views', models.BigIntegerField(default=0)),
+                ('hour', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='uservisit',
+            name='last_rolled_view',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_views_rolled, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='hourlyvisitrollup',
+            index=models.Index(fields=['hour'], name='hourly_visit_rollup_hour_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='hourlyvisitrollup',
+            unique_together={('url', 'method', 'hour')},
+        ),
+        migrations.AddIndex(
+            model_name='dailyvisitrollup',
+            index=models.Index(fields=['day'], name='daily_visit_rollup_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyvisitrollup',
+            unique_together={('url', 'method', 'day')},
+        ),
+    ]
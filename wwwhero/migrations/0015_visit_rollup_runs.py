@@ -0,0 +1,32 @@
+# Generated by Django 3.2.18 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wwwhero', '0014_visit_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitRollupRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('visits', models.PositiveIntegerField()),
+                ('views', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='uservisit',
+            name='last_rolled_view',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='uservisit',
+            name='view',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.18 on 2026-10-18 14:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wwwhero', '0015_visit_rollup_runs'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='location',
+            name='location_active_level_idx',
+        ),
+    ]
@@ -3,8 +3,10 @@ from random import randint
 from datetime import timedelta
 
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models, transaction
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
 from django.utils import timezone
 
 from wwwhero.exceptions import LevelUpCooldownError, MaxLevelError
@@ -20,40 +22,76 @@ class Character(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def level_up(self):
+        """Level up, claiming the level cooldown first.
+
+        The cooldown is claimed with a conditional UPDATE (or an INSERT
+        guarded by the unique constraint), which also row-locks it until
+        commit, so concurrent level ups of one character can't both pass.
+        Everything else is applied with F() increments: four statements
+        in the usual case. A cooldown known to the cache fails with no
+        queries at all.
+        """
+        from wwwhero import conditional, cooldowns
+
+        if self.level >= self.MAX_LEVEL:
+            raise MaxLevelError
+        if cooldowns.get_until(self.id, CharacterCooldown.Type.LEVEL):
+            raise LevelUpCooldownError
+
+        now = timezone.now()
+        until = now + timedelta(seconds=2 ** (self.level + 1))
+
+        try:
+            with transaction.atomic():
+                self._level_up(now, until)
+        except (LevelUpCooldownError, MaxLevelError):
+            cooldowns.forget(self.id, CharacterCooldown.Type.LEVEL)
+            raise
+
+        transaction.on_commit(
+            lambda: cooldowns.remember(self.id, CharacterCooldown.Type.LEVEL, until)
+        )
+        # the UPDATEs above send no signals
+        conditional.touch_on_commit(self.id, self.user_id)
         self.level += 1
-        attrs, _ = CharacterAttributes.objects.get_or_create(character=self)
+        self.updated_at = now
 
-        cooldown = CharacterCooldown.objects.filter(
+    def _level_up(self, now, until):
+        claimed = CharacterCooldown.objects.filter(
             character=self,
             type=CharacterCooldown.Type.LEVEL,
-        ).first()
-        if cooldown and cooldown.until > timezone.now():
-            raise LevelUpCooldownError
-
-        if self.level > self.MAX_LEVEL:
+            until__lte=now,
+        ).update(until=until)
+        if not claimed:
+            try:
+                with transaction.atomic():
+                    CharacterCooldown.objects.create(
+                        character=self,
+                        type=CharacterCooldown.Type.LEVEL,
+                        until=until,
+                    )
+            except IntegrityError:
+                raise LevelUpCooldownError
+
+        leveled = Character.objects.filter(
+            pk=self.pk,
+            level__lt=self.MAX_LEVEL,
+        ).update(level=F("level") + 1, updated_at=now)
+        if not leveled:
             raise MaxLevelError
 
-        with transaction.atomic():
-            CharacterCooldown.objects.update_or_create(
-                character=self,
-                type=CharacterCooldown.Type.LEVEL,
-                defaults={
-                    "until": timezone.now() + timedelta(seconds=2 ** self.level)
-                }
-            )
-
-            inv = Inventory.objects.get(character=self)
-            inv.max_space += 1
-            inv.save(update_fields=["max_space"])
-
-            attrs.upgrade()
-            self.save()
+        Inventory.objects.filter(character=self).update(max_space=F("max_space") + 1)
+        CharacterAttributes(character=self).upgrade()
 
     def __str__(self):
         return f"{self.user}, {self.name}, level {self.level}"
 
     class Meta:
         unique_together = ["user", "name"]
+        indexes = [
+            # the character list of the index page
+            models.Index(fields=["user", "-updated_at"], name="character_user_updated_idx"),
+        ]
 
 
 class CharacterSelection(models.Model):
@@ -75,12 +113,27 @@ class CharacterAttributes(models.Model):
     luck = models.IntegerField(default=1)
 
     def upgrade(self):
+        """Spend the level up points.
+
+        The row is changed with F() increments, so a stale or unsaved
+        instance works too; a missing row is created.
+        """
         hp_increase = randint(1, 24)
+        dmg_increase = self.LEVEL_UP_POINTS - hp_increase
+        luck_increase = randint(0, 1)
         self.max_hp += hp_increase
         self.hp += hp_increase
-        self.dmg += self.LEVEL_UP_POINTS - hp_increase
-        self.luck += randint(0, 1)
-        self.save()
+        self.dmg += dmg_increase
+        self.luck += luck_increase
+
+        updated = CharacterAttributes.objects.filter(pk=self.pk).update(
+            max_hp=F("max_hp") + hp_increase,
+            hp=F("hp") + hp_increase,
+            dmg=F("dmg") + dmg_increase,
+            luck=F("luck") + luck_increase,
+        )
+        if not updated:
+            self.save(force_insert=True)
 
     def __str__(self):
         return f"Character name: {self.character.name}," \
@@ -105,7 +158,8 @@ class CharacterCooldown(models.Model):
     until = models.DateTimeField()
 
     class Meta:
-        unique_together = ["type", "character"]
+        # character first: cooldowns are looked up per character
+        unique_together = ["character", "type"]
 
 
 class LocationType(models.Model):
@@ -174,6 +228,27 @@ class ItemBlueprint(models.Model):
 class Inventory(models.Model):
     character = models.ForeignKey(Character, on_delete=models.CASCADE)
     max_space = models.PositiveSmallIntegerField(default=20)
+    # items in the inventory, kept by reserve_slots() and free_slots()
+    used_slots = models.PositiveSmallIntegerField(default=0)
+
+    def reserve_slots(self, count):
+        """Take ``count`` free slots with a conditional UPDATE, False when they aren't free.
+
+        The UPDATE also locks the row until commit, so concurrent
+        reservations on one inventory are serialized.
+        """
+        reserved = Inventory.objects.filter(
+            pk=self.pk,
+            used_slots__lte=F("max_space") - count,
+        ).update(used_slots=F("used_slots") + count)
+        if reserved:
+            self.used_slots += count
+
+        return bool(reserved)
+
+    def free_slots(self, count):
+        Inventory.objects.filter(pk=self.pk).update(used_slots=F("used_slots") - count)
+        self.used_slots -= count
 
     def __str__(self):
         return f"{self.character}'s inventory"
@@ -190,11 +265,13 @@ class Item(models.Model):
     MAX_NAME_LENGTH = 64
 
     blueprint = models.ForeignKey(ItemBlueprint, on_delete=models.CASCADE)
+    # indexed by the partial indexes below, dropped items are left out
     inventory = models.ForeignKey(
         Inventory,
         blank=True,
         null=True,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False,
     )
     name = models.CharField(max_length=MAX_NAME_LENGTH, default="")
 
@@ -220,38 +297,80 @@ class Item(models.Model):
 
         return f"{prefix}{self.name}{inventory}"
 
-    def generate_name(self):
-        prefixes = {
-            self.Rarity.COMMON: ["broken", "old", "useless", "dirty", "ugly"],
-            self.Rarity.UNCOMMON: ["simple", "ordinary", "uncommon"],
-            self.Rarity.RARE: ["new", "nice", "quality", "rare", "shiny"],
-            self.Rarity.EPIC: ["fancy", "epic", "brutal"],
-            self.Rarity.LEGENDARY: ["legendary", "extraordinary", "incredible"],
-        }
-        postfixes = {
-            self.Rarity.COMMON: ["dumbness", "misery", "bad luck", "dirt", ""],
-            self.Rarity.UNCOMMON: ["", "fear", ""],
-            self.Rarity.RARE: ["", "queen", "king", "sad harold"],
-            self.Rarity.EPIC: ["rare sand", "void from the ocean", "epicity"],
-            self.Rarity.LEGENDARY: ["insane power", "", "immortality", "unstable power"],
-        }
-
-        postfix = random.choice(postfixes[self.Rarity(self.rarity)])
-        prefix = random.choice(prefixes[self.Rarity(self.rarity)])
-
-        self.name = f"{prefix} {self.blueprint.name}{' of ' + postfix if postfix else ''}"
-        if len(self.name) > self.MAX_NAME_LENGTH:
-            self.name = self.blueprint.name
-        self.save(update_fields=["name"])
+    class Meta:
+        indexes = [
+            # stacks of an inventory, looked up by the loot search
+            models.Index(
+                fields=["inventory", "blueprint"], condition=Q(inventory__isnull=False), name="item_stack_idx",
+            ),
+            # inventory listing in insertion order
+            models.Index(
+                fields=["inventory", "id"], condition=Q(inventory__isnull=False), name="item_inventory_list_idx",
+            ),
+        ]
+
+    def generate_name(self, save=False, rng=random):
+        """Give the item a random name, before it's inserted unless ``save``."""
+        self.name = make_item_name(self.blueprint.name, self.rarity, rng)
+        if save:
+            self.save(update_fields=["name"])
 
         return self.name
 
+    @staticmethod
+    def generate_names(items, rng=random):
+        """Name unsaved items in bulk, ready for ``bulk_create``.
+
+        Blueprint names come from the catalog, so the items only need
+        ``blueprint_id``.
+        """
+        from wwwhero.catalog import get_catalog
+
+        blueprints = get_catalog().by_id
+        for item in items:
+            item.name = make_item_name(blueprints[item.blueprint_id].name, item.rarity, rng)
+
+        return items
+
+
+_NAME_PREFIXES = {
+    Item.Rarity.COMMON: ("broken", "old", "useless", "dirty", "ugly"),
+    Item.Rarity.UNCOMMON: ("simple", "ordinary", "uncommon"),
+    Item.Rarity.RARE: ("new", "nice", "quality", "rare", "shiny"),
+    Item.Rarity.EPIC: ("fancy", "epic", "brutal"),
+    Item.Rarity.LEGENDARY: ("legendary", "extraordinary", "incredible"),
+}
+_NAME_POSTFIXES = {
+    Item.Rarity.COMMON: ("dumbness", "misery", "bad luck", "dirt", ""),
+    Item.Rarity.UNCOMMON: ("", "fear", ""),
+    Item.Rarity.RARE: ("", "queen", "king", "sad harold"),
+    Item.Rarity.EPIC: ("rare sand", "void from the ocean", "epicity"),
+    Item.Rarity.LEGENDARY: ("insane power", "", "immortality", "unstable power"),
+}
+# "prefix " and " of postfix" parts, rendered once
+_NAME_HEADS = {rarity: tuple(f"{prefix} " for prefix in prefixes) for rarity, prefixes in _NAME_PREFIXES.items()}
+_NAME_TAILS = {
+    rarity: tuple(f" of {postfix}" if postfix else "" for postfix in postfixes)
+    for rarity, postfixes in _NAME_POSTFIXES.items()
+}
+
+
+def make_item_name(blueprint_name, rarity, rng=random):
+    """Random item name for a blueprint name and a rarity, without side effects."""
+    name = f"{rng.choice(_NAME_HEADS[rarity])}{blueprint_name}{rng.choice(_NAME_TAILS[rarity])}"
+    if len(name) > Item.MAX_NAME_LENGTH:
+        return blueprint_name
+
+    return name
+
 
 class UserVisit(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    view = models.PositiveSmallIntegerField(default=0)
+    view = models.PositiveIntegerField(default=0)
     url = models.CharField(null=False, max_length=200)
     method = models.CharField(max_length=8)
+    # the views already added to the rollups (see wwwhero/rollups.py)
+    last_rolled_view = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         if len(self.url) > 10:
@@ -263,3 +382,137 @@ class UserVisit(models.Model):
 
     class Meta:
         unique_together = ["user", "url", "method"]
+
+
+class VisitRollup(models.Model):
+    """Views of a page in a time bucket, summed over all users."""
+
+    url = models.CharField(max_length=200)
+    method = models.CharField(max_length=8)
+    views = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class HourlyVisitRollup(VisitRollup):
+    hour = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.method} {self.url}: {self.views} views"
+
+    class Meta:
+        unique_together = ["url", "method", "hour"]
+        indexes = [models.Index(fields=["hour"], name="hourly_visit_rollup_hour_idx")]
+
+
+class DailyVisitRollup(VisitRollup):
+    day = models.DateField()
+
+    def __str__(self):
+        return f"{self.day} {self.method} {self.url}: {self.views} views"
+
+    class Meta:
+        unique_together = ["url", "method", "day"]
+        indexes = [models.Index(fields=["day"], name="daily_visit_rollup_day_idx")]
+
+
+class VisitRollupRun(models.Model):
+    """A run of the visit rollups, the views it added went to the buckets of ``started_at``."""
+
+    started_at = models.DateTimeField(db_index=True)
+    visits = models.PositiveIntegerField()
+    views = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.started_at:%Y-%m-%d %H:%M}: {self.views} views"
+
+
+class LootWeight(models.Model):
+    """A weight of a blueprint or a rarity in the loot table of a location.
+
+    Entries without location and location type change the global odds,
+    location type entries override them and location entries override both.
+    Weight 0 removes the blueprint or rarity from the table.
+    """
+    location_type = models.ForeignKey(
+        LocationType,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE
+    )
+    location = models.ForeignKey(
+        Location,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE
+    )
+    blueprint = models.ForeignKey(
+        ItemBlueprint,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE
+    )
+    rarity = models.PositiveSmallIntegerField(
+        choices=Item.Rarity.choices,
+        blank=True,
+        null=True
+    )
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    def clean(self):
+        if (self.blueprint_id is None) == (self.rarity is None):
+            raise ValidationError("Set either a blueprint or a rarity.")
+        if self.location_id and self.location_type_id:
+            raise ValidationError("Set either a location or a location type.")
+
+    def __str__(self):
+        scope = self.location or self.location_type or "everywhere"
+        outcome = self.blueprint or Item.Rarity(self.rarity).label
+
+        return f"{outcome}: {self.weight} ({scope})"
+
+
+class Wallet(models.Model):
+    """Gold of a character, changed only with F() increments (see wwwhero/wallet.py)."""
+
+    character = models.OneToOneField(
+        Character,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    gold = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.character}: {self.gold} gold"
+
+
+class GoldLedgerEntry(models.Model):
+    """An append-only record of a gold change of a character."""
+
+    class Reason(models.IntegerChoices):
+        LOOT = 1, "Loot"
+        OPENING_BALANCE = 2, "Opening balance"
+
+    character = models.ForeignKey(Character, on_delete=models.CASCADE)
+    amount = models.BigIntegerField()
+    reason = models.PositiveSmallIntegerField(choices=Reason.choices)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.character}: {self.amount:+d} gold ({self.get_reason_display()})"
+
+
+class ImageVariants(models.Model):
+    """The resized WebP variants built for an uploaded image (see wwwhero/images.py)."""
+
+    source = models.CharField(max_length=255, primary_key=True)
+    # hash of the source content, which names the variant files
+    digest = models.CharField(max_length=16)
+    widths = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"{self.source}: {', '.join(map(str, self.widths))}"
+
+    class Meta:
+        verbose_name_plural = "Image variants"
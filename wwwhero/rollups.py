@@ -0,0 +1,88 @@
+"""Hourly and daily page view rollups of ``UserVisit``.
+
+``UserVisit`` only keeps an all-time ``view`` counter per user and page, so
+``roll_up()`` turns its growth into time series: the views counted since
+the last run (``view - last_rolled_view``) are summed per page and added
+to the ``HourlyVisitRollup`` and ``DailyVisitRollup`` buckets of the run
+time. Run it every hour (``manage.py rollup_visits``), traffic queries
+then read the rollup tables and never the visit counters.
+
+The counters don't tell when a view happened, so a bucket holds the views
+counted between the previous run and the run in its hour: the hourly
+series is only as regular as the runs. Every run is logged as a
+``VisitRollupRun``, and ``skips_hours`` tells when hours were skipped and
+folded into one bucket.
+
+The visit rows are streamed with ``.iterator()`` and each chunk is added
+to the rollups and marked rolled in one transaction, so an interrupted
+run loses nothing and a rerun counts nothing twice. A view counted while
+a chunk is rolled up stays pending for the next run.
+"""
+from collections import Counter, namedtuple
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from wwwhero.bulk import bulk_increment
+from wwwhero.models import DailyVisitRollup, HourlyVisitRollup, UserVisit, VisitRollupRun
+
+CHUNK_SIZE = 2000
+
+RollupResult = namedtuple("RollupResult", "visits views previous_run")
+
+
+def buckets(now):
+    """The hour and the local day ``now`` falls into."""
+    return now.replace(minute=0, second=0, microsecond=0), timezone.localdate(now)
+
+
+def _roll_up_chunk(rows, hour, day):
+    views = Counter()
+    for _, url, method, view, last_rolled_view in rows:
+        views[url, method] += view - last_rolled_view
+
+    with transaction.atomic():
+        bulk_increment(
+            HourlyVisitRollup, ("url", "method", "hour"), "views",
+            {(url, method, hour): count for (url, method), count in views.items()},
+        )
+        bulk_increment(
+            DailyVisitRollup, ("url", "method", "day"), "views",
+            {(url, method, day): count for (url, method), count in views.items()},
+        )
+        UserVisit.objects.bulk_update(
+            [UserVisit(pk=pk, last_rolled_view=view) for pk, _, _, view, _ in rows],
+            ["last_rolled_view"],
+            batch_size=500,
+        )
+
+    return sum(views.values())
+
+
+def skips_hours(previous_run, now):
+    """Whether a run at ``now`` after one at ``previous_run`` folds skipped hours into one bucket."""
+    return previous_run is not None and buckets(now)[0] - buckets(previous_run)[0] > timedelta(hours=1)
+
+
+def roll_up(now=None, chunk_size=CHUNK_SIZE):
+    """Add the views since the last run to the buckets of ``now`` (default: the current time)."""
+    now = now or timezone.now()
+    hour, day = buckets(now)
+    previous_run = VisitRollupRun.objects.order_by("-started_at").values_list("started_at", flat=True).first()
+    pending = UserVisit.objects.filter(view__gt=F("last_rolled_view")).order_by().values_list(
+        "id", "url", "method", "view", "last_rolled_view",
+    )
+    rows = pending.iterator(chunk_size=chunk_size)
+    visits = views = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        views += _roll_up_chunk(chunk, hour, day)
+        visits += len(chunk)
+    VisitRollupRun.objects.create(started_at=now, visits=visits, views=views)
+
+    return RollupResult(visits, views, previous_run)
@@ -0,0 +1,74 @@
+"""Denormalized inventory read model for the character page.
+
+An inventory snapshot is a tuple of ``InventoryRow`` value tuples holding
+the item and blueprint fields the templates need, kept in Django's cache.
+Its key carries the version stamp of the inventory and of the blueprint
+catalog, so actions never patch a cached snapshot: they bump the
+inventory version once their transaction commits, and the next read
+rebuilds the snapshot with a single query and the blueprint catalog.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from wwwhero import versions
+from wwwhero.catalog import get_catalog
+from wwwhero.models import Item
+
+SNAPSHOT_TTL = 600
+
+ITEM_FIELDS = ("id", "blueprint_id", "name", "amount", "level", "cost", "min_damage", "max_damage")
+
+InventoryRow = namedtuple(
+    "InventoryRow",
+    ITEM_FIELDS + ("is_stackable", "is_droppable", "description"),
+)
+
+
+def _version_name(inventory_id):
+    return f"inventory:{inventory_id}"
+
+
+def _key(inventory_id, version, catalog):
+    return f"wwwhero:inventory:{inventory_id}:{version}:{catalog.version}"
+
+
+def _row(values, catalog):
+    blueprint = catalog.by_id[values[1]]
+
+    return InventoryRow(
+        *values,
+        is_stackable=blueprint.is_stackable,
+        is_droppable=blueprint.is_droppable,
+        description=blueprint.description,
+    )
+
+
+def get_rows(inventory_id):
+    key = _key(inventory_id, versions.get(_version_name(inventory_id)), get_catalog())
+    rows = cache.get(key)
+    if rows is None:
+        rows = rebuild(inventory_id)
+
+    return rows
+
+
+def rebuild(inventory_id):
+    # the version is read before the items: rows read before a concurrent
+    # change commits are cached under the version that change replaces
+    version = versions.get(_version_name(inventory_id))
+    catalog = get_catalog()
+    items = Item.objects.filter(inventory_id=inventory_id).order_by("id")
+    rows = tuple(_row(values, catalog) for values in items.values_list(*ITEM_FIELDS))
+    cache.set(_key(inventory_id, version, catalog), rows, SNAPSHOT_TTL)
+
+    return rows
+
+
+def invalidate(inventory_id):
+    versions.bump(_version_name(inventory_id))
+
+
+def invalidate_on_commit(inventory_id):
+    transaction.on_commit(lambda: invalidate(inventory_id))
@@ -0,0 +1,17 @@
+from django import template
+
+from wwwhero import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_url(image, width):
+    """``{% image_url location.image 1280 %}``: the variant to show ``width`` pixels wide."""
+    return images.variant_url(image, width)
+
+
+@register.simple_tag
+def image_srcset(image):
+    """``{% image_srcset location.image %}``: all variants, for the browser to choose."""
+    return images.srcset(image)
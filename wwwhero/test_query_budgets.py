@@ -0,0 +1,137 @@
+import tempfile
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from wwwhero import visits
+from wwwhero.models import (
+    Character,
+    CharacterAttributes,
+    CharacterCooldown,
+    CharacterLocation,
+    CharacterSelection,
+    Inventory,
+    Item,
+    ItemBlueprint,
+    Location,
+    LocationType,
+    LootWeight,
+    User,
+)
+from wwwhero.urls import urlpatterns
+
+INVENTORY_SIZE = 12
+
+# url name, url kwargs (built from the test case), method, queries.
+# Visits are buffered and caches start cold, so a budget is the cost of
+# the view itself. Raise a budget only together with the change that
+# needs it.
+QUERY_BUDGETS = [
+    ("index", lambda t: {}, "get", 4),
+    ("character_select", lambda t: {"character_id": t.char.id}, "get", 8),
+    ("character_detail", lambda t: {}, "get", 6),
+    ("character_create", lambda t: {}, "get", 2),
+    ("character_level_up", lambda t: {}, "get", 10),
+    ("character_loot", lambda t: {}, "get", 10),
+    ("character_loot_batch", lambda t: {"times": 5}, "get", 10),
+    ("inventory_drop", lambda t: {"item_id": t.stones.id}, "get", 6),
+    ("inventory_drop_all", lambda t: {"item_id": t.stones.id, "drop_all": "all"}, "get", 9),
+    ("map", lambda t: {}, "get", 4),
+    ("location_select", lambda t: {"location_id": t.cave.id}, "get", 8),
+    ("story", lambda t: {}, "get", 3),
+    ("image_variant", lambda t: {"name": "0123456789abcdef-64.webp"}, "get", 0),
+    ("api_character_state", lambda t: {}, "get", 4),
+    ("api_character_cooldowns", lambda t: {}, "get", 4),
+    ("api_character_level_up", lambda t: {}, "post", 12),
+    ("api_character_loot", lambda t: {}, "post", 11),
+    ("api_inventory", lambda t: {}, "get", 5),
+    ("api_inventory_drop", lambda t: {"item_id": t.stones.id}, "post", 7),
+    ("signup", lambda t: {}, "get", 2),
+    ("login", lambda t: {}, "get", 2),
+    ("logout", lambda t: {}, "get", 4),
+]
+
+
+@override_settings(VISIT_COUNTER_MODE=visits.BUFFERED, VISIT_COUNTER_FLUSH_INTERVAL=0)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Bob", password="strong!1")
+        cls.char = Character.objects.create(user=cls.user, name="Dylan", level=3)
+        CharacterAttributes.objects.create(character=cls.char)
+        cls.inv = Inventory.objects.create(
+            character=cls.char, max_space=INVENTORY_SIZE * 2, used_slots=INVENTORY_SIZE,
+        )
+        CharacterSelection.objects.create(user=cls.user, character=cls.char)
+        CharacterCooldown.objects.create(
+            character=cls.char,
+            type=CharacterCooldown.Type.LEVEL,
+            until=timezone.now() - timedelta(minutes=1),
+        )
+
+        forest = LocationType.objects.create(name="forest")
+        cls.woods = Location.objects.create(name="Woods", type=forest, is_active=True)
+        cls.cave = Location.objects.create(name="Cave", type=forest, is_active=True, min_level=2)
+        Location.objects.create(name="Peak", type=forest, is_active=True, min_level=10)
+        CharacterLocation.objects.create(character=cls.char, location=cls.woods)
+
+        stone = ItemBlueprint.objects.create(
+            name="stone",
+            item_type=ItemBlueprint.ItemType.JUNK,
+            slot_type=ItemBlueprint.SlotType.INVENTORY,
+            is_stackable=True,
+            is_droppable=True,
+        )
+        sword = ItemBlueprint.objects.create(
+            name="sword",
+            item_type=ItemBlueprint.ItemType.WEAPON,
+            slot_type=ItemBlueprint.SlotType.RIGHT,
+            is_droppable=True,
+        )
+        # only swords drop, so every loot costs the same
+        LootWeight.objects.create(blueprint=stone, weight=0)
+        LootWeight.objects.create(blueprint=ItemBlueprint.objects.get(name="gold"), weight=0)
+
+        cls.stones = Item.objects.create(
+            inventory=cls.inv, blueprint=stone, rarity=Item.Rarity.COMMON,
+            name="stone", amount=5,
+        )
+        for level in range(1, INVENTORY_SIZE):
+            Item.objects.create(
+                inventory=cls.inv, blueprint=sword, rarity=Item.Rarity.RARE,
+                name=f"sword {level}", level=level, min_damage=level, max_damage=level * 2,
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.addCleanup(visits.flush)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        default_storage.save("variants/0123456789abcdef-64.webp", ContentFile(b"RIFF"))
+
+    def test_query_budgets(self):
+        for name, kwargs, method, budget in QUERY_BUDGETS:
+            with self.subTest(name), transaction.atomic():
+                cache.clear()
+                url = reverse(name, kwargs=kwargs(self))
+
+                with self.assertNumQueries(budget):
+                    response = getattr(self.client, method)(url)
+
+                self.assertLess(response.status_code, 400)
+                transaction.set_rollback(True)
+
+    def test_every_url_has_a_budget(self):
+        self.assertEqual(
+            {pattern.name for pattern in urlpatterns},
+            {name for name, *_ in QUERY_BUDGETS},
+        )
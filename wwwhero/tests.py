@@ -1,8 +1,60 @@
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+from collections import Counter
+from datetime import timedelta
 from unittest import mock
 
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 
-from wwwhero.models import CharacterAttributes, Character, Inventory, User
+from wwwhero import (
+    actions, checks, cooldowns, dbpool, images, loot, rollups, snapshots, versions, views, visits, wallet, warmup,
+)
+from wwwhero.admin import ItemAdmin
+from wwwhero.admin_paging import EstimatedCountPaginator
+from wwwhero.buffers import WriteBehindBuffer
+from wwwhero.locations import VERSION_NAME as LOCATIONS_VERSION_NAME, get_locations
+from wwwhero.middleware import load_active_character
+from wwwhero.exceptions import InventoryFullError, LevelUpCooldownError, MaxLevelError
+from wwwhero.catalog import VERSION_NAME as CATALOG_VERSION_NAME, get_catalog
+from wwwhero.models import (
+    CharacterAttributes,
+    Character,
+    CharacterCooldown,
+    CharacterLocation,
+    CharacterSelection,
+    DailyVisitRollup,
+    GoldLedgerEntry,
+    HourlyVisitRollup,
+    Inventory,
+    Item,
+    ItemBlueprint,
+    Location,
+    LocationType,
+    LootWeight,
+    User,
+    UserVisit,
+    VisitRollupRun,
+    Wallet,
+    make_item_name,
+)
 
 
 class CharacterAttributesModelTests(TestCase):
@@ -25,6 +77,7 @@ class CharacterAttributesModelTests(TestCase):
 
 class CharacterModelTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.u = User.objects.create_user(username="Bob", password="strong!1")
         self.char = Character.objects.create(user=self.u, name="Dylan")
         self.attrs = CharacterAttributes.objects.create(character=self.char)
@@ -44,3 +97,1298 @@ class CharacterModelTests(TestCase):
 
         self.char.level_up()
         self.assertEqual(CharacterAttributes.objects.all().count(), 1)
+
+    def test_level_up_persists_everything(self):
+        self.char.level_up()
+
+        self.char.refresh_from_db()
+        self.attrs.refresh_from_db()
+        self.inv.refresh_from_db()
+        self.assertEqual(self.char.level, 2)
+        self.assertEqual(self.attrs.hp + self.attrs.dmg, 11 + CharacterAttributes.LEVEL_UP_POINTS)
+        self.assertEqual(self.inv.max_space, 21)
+        cooldown = CharacterCooldown.objects.get(character=self.char)
+        self.assertGreater(cooldown.until, timezone.now() + timedelta(seconds=3))
+
+    def test_level_up_query_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CharacterCooldown.objects.create(
+                character=self.char,
+                type=CharacterCooldown.Type.LEVEL,
+                until=timezone.now(),
+            )
+
+        # savepoint, cooldown, character, inventory, attributes, release
+        with self.assertNumQueries(6):
+            self.char.level_up()
+
+    def test_level_up_cooldown(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.char.level_up()
+
+        with self.assertNumQueries(0), self.assertRaises(LevelUpCooldownError):
+            self.char.level_up()
+
+    def test_concurrent_level_up_passes_once(self):
+        first = Character.objects.get(pk=self.char.pk)
+        second = Character.objects.get(pk=self.char.pk)
+
+        first.level_up()
+        with self.assertRaises(LevelUpCooldownError):
+            second.level_up()
+
+        self.char.refresh_from_db()
+        self.inv.refresh_from_db()
+        self.assertEqual(self.char.level, 2)
+        self.assertEqual(self.inv.max_space, 21)
+
+    def test_max_level(self):
+        Character.objects.filter(pk=self.char.pk).update(level=Character.MAX_LEVEL)
+        stale = Character.objects.get(pk=self.char.pk)
+        stale.level = Character.MAX_LEVEL - 1
+
+        with self.assertRaises(MaxLevelError):
+            stale.level_up()
+
+        self.assertFalse(CharacterCooldown.objects.exists())
+
+
+class WriteBehindBufferTests(TestCase):
+    def setUp(self):
+        self.written = []
+        self.buffer = WriteBehindBuffer(self.write, interval=lambda: 0, max_attempts=2)
+
+    def write(self, records):
+        if "poison" in records:
+            raise ValueError("bad record")
+        self.written.extend(records)
+
+    def test_failed_batch_is_retried_then_written_without_the_bad_record(self):
+        for record in ("a", "poison", "b", "c"):
+            self.buffer.add(record)
+
+        with self.assertLogs("wwwhero.buffers", "ERROR"):
+            self.buffer.flush()
+        self.assertEqual((self.written, len(self.buffer)), ([], 4))
+
+        with self.assertLogs("wwwhero.buffers", "ERROR") as logs:
+            self.buffer.flush()
+        self.assertEqual(sorted(self.written), ["a", "b", "c"])
+        self.assertEqual(len(self.buffer), 0)
+        self.assertIn("Dropped 1 buffered records the handler failed on: ['poison']", logs.output[-1])
+
+        self.buffer.add("d")
+        self.buffer.flush()
+        self.assertEqual(self.written[-1], "d")
+
+    def test_full_buffer_drops_new_records_and_logs_them_once(self):
+        buffer = WriteBehindBuffer(self.write, interval=lambda: 0, max_size=2, capacity=3)
+        for record in "abcde":
+            buffer.add(record)
+        self.assertEqual((self.written, len(buffer)), ([], 3))
+
+        with self.assertLogs("wwwhero.buffers", "ERROR") as logs:
+            buffer.flush()
+        self.assertEqual(self.written, ["a", "b", "c"])
+        self.assertEqual(logs.output, ["ERROR:wwwhero.buffers:Dropped 2 records, the buffer was full"])
+
+
+@override_settings(VISIT_COUNTER_MODE=visits.BUFFERED, VISIT_COUNTER_FLUSH_INTERVAL=0)
+class BufferedVisitCounterTests(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.factory = RequestFactory()
+        self.addCleanup(visits.flush)
+
+    def visit(self, path, method="get"):
+        request = getattr(self.factory, method)(path)
+        request.user = self.u
+        visits.count_user_visit(request)
+
+    def test_visit_is_not_written_until_flush(self):
+        with self.assertNumQueries(0):
+            self.visit("/map/")
+
+        self.assertFalse(UserVisit.objects.exists())
+
+    def test_flush_upserts_counters(self):
+        UserVisit.objects.create(user=self.u, url="/map/", method="GET", view=5)
+        for _ in range(3):
+            self.visit("/map/")
+        self.visit("/story/")
+        self.visit("/story/", method="post")
+
+        visits.flush()
+
+        views = dict(
+            ((v.url, v.method), v.view) for v in UserVisit.objects.filter(user=self.u)
+        )
+        self.assertEqual(views, {
+            ("/map/", "GET"): 8,
+            ("/story/", "GET"): 1,
+            ("/story/", "POST"): 1,
+        })
+
+
+class DBPoolTests(TestCase):
+    @override_settings(ASYNC_DB_THREADS=2)
+    def test_pooled_view_is_async_with_a_pool(self):
+        def view(request):
+            return HttpResponse(threading.get_ident())
+
+        pooled = dbpool.pooled_view(view)
+
+        self.assertTrue(asyncio.iscoroutinefunction(pooled))
+        response = async_to_sync(pooled)(RequestFactory().get("/"))
+        self.assertNotEqual(response.content, str(threading.get_ident()).encode())
+
+    @override_settings(ASYNC_DB_THREADS=0)
+    def test_pooled_view_is_unchanged_without_a_pool(self):
+        self.assertIs(dbpool.pooled_view(views.index), views.index)
+
+    @override_settings(ASYNC_DB_THREADS=2)
+    def test_runs_in_pool_threads(self):
+        ident = async_to_sync(dbpool.run)(threading.get_ident)
+
+        self.assertNotEqual(ident, threading.get_ident())
+
+    @override_settings(ASYNC_DB_THREADS=0)
+    def test_disabled_pool_runs_deferred_work_inline(self):
+        calls = []
+
+        dbpool.defer(calls.append, 1)
+
+        self.assertEqual(calls, [1])
+
+    def test_spawned_work_runs_in_its_own_thread(self):
+        done = threading.Event()
+        idents = []
+
+        dbpool.spawn(lambda: (idents.append(threading.get_ident()), done.set()))
+
+        self.assertTrue(done.wait(5))
+        self.assertNotEqual(idents, [threading.get_ident()])
+
+    def test_visit_is_counted_by_pooled_view(self):
+        user = User.objects.create_user(username="Bob", password="strong!1")
+        self.client.force_login(user)
+
+        self.client.get("/")
+
+        self.assertEqual(UserVisit.objects.get(user=user, url="/").view, 1)
+
+    def test_deferred_visit_gets_plain_values(self):
+        user = User.objects.create_user(username="Bob", password="strong!1")
+        request = RequestFactory().get("/map/")
+        request.user = user
+
+        with mock.patch.object(dbpool, "defer") as defer:
+            visits.defer_user_visit(request)
+
+        defer.assert_called_once_with(visits.count_visit, user.id, "/map/", "GET")
+
+    def test_health_checks_close_broken_connections(self):
+        broken = mock.Mock(connection=object(), settings_dict={"CONN_HEALTH_CHECKS": True}, in_atomic_block=False)
+        broken.is_usable.return_value = False
+        unchecked = mock.Mock(connection=object(), settings_dict={}, in_atomic_block=False)
+        unchecked.is_usable.return_value = False
+
+        with mock.patch.object(dbpool.connections, "all", return_value=[broken, unchecked]):
+            dbpool.check_connections()
+
+        broken.close.assert_called_once_with()
+        unchecked.is_usable.assert_not_called()
+        unchecked.close.assert_not_called()
+
+
+class BlueprintCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gold = ItemBlueprint.objects.get(name="gold")
+        self.sword = ItemBlueprint.objects.create(
+            name="sword",
+            item_type=ItemBlueprint.ItemType.WEAPON,
+            slot_type=ItemBlueprint.SlotType.RIGHT,
+        )
+
+    def test_indexes(self):
+        catalog = get_catalog()
+
+        self.assertEqual(catalog.by_id[self.sword.id].name, "sword")
+        self.assertEqual(catalog.by_name["gold"].id, self.gold.id)
+        self.assertEqual(
+            [bp.name for bp in catalog.by_type[ItemBlueprint.ItemType.WEAPON]],
+            ["sword"],
+        )
+
+    def test_cached_between_calls(self):
+        catalog = get_catalog()
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_catalog(), catalog)
+            catalog.choice()
+
+    def test_invalidated_on_save_and_delete(self):
+        get_catalog()
+
+        self.sword.description = "sharp"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sword.save()
+            # not bumped before the commit
+            self.assertNotEqual(get_catalog().by_name["sword"].description, "sharp")
+        self.assertEqual(get_catalog().by_name["sword"].description, "sharp")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gold.delete()
+        self.assertNotIn("gold", get_catalog().by_name)
+
+
+class AliasSamplerTests(TestCase):
+    def test_sample_follows_weights(self):
+        sampler = loot.AliasSampler({"a": 1, "b": 3, "never": 0})
+        rng = random.Random(42)
+
+        counts = Counter(sampler.sample(rng) for _ in range(20000))
+
+        self.assertEqual(set(counts), {"a", "b"})
+        self.assertAlmostEqual(counts["b"] / counts["a"], 3, delta=0.3)
+
+    def test_requires_positive_weight(self):
+        with self.assertRaises(ValueError):
+            loot.AliasSampler({"a": 0})
+
+
+class LootTableTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gold = ItemBlueprint.objects.get(name="gold")
+        self.sword = ItemBlueprint.objects.create(
+            name="sword",
+            item_type=ItemBlueprint.ItemType.WEAPON,
+            slot_type=ItemBlueprint.SlotType.RIGHT,
+        )
+        self.forest = LocationType.objects.create(name="forest")
+        self.cave = LocationType.objects.create(name="cave")
+        self.woods = Location.objects.create(name="Woods", type=self.forest, min_level=3)
+        self.mine = Location.objects.create(name="Mine", type=self.cave)
+
+    def roll_many(self, location, seed=1, times=200):
+        rng = random.Random(seed)
+        return [loot.roll(location, rng) for _ in range(times)]
+
+    def test_seeded_rolls_replay(self):
+        self.assertEqual(self.roll_many(self.woods), self.roll_many(self.woods))
+
+    def test_weapon_drop_formulas(self):
+        for drop in self.roll_many(self.woods):
+            self.assertIn(drop.level, [2, 3, 4])
+            self.assertEqual(drop.cost, drop.level * drop.rarity * drop.blueprint.base_cost)
+            if drop.blueprint == self.sword:
+                self.assertLessEqual(drop.level + drop.rarity, drop.min_damage)
+                self.assertLessEqual(drop.min_damage, drop.max_damage)
+
+    def test_location_weights_override_type_weights(self):
+        LootWeight.objects.create(location_type=self.forest, blueprint=self.gold, weight=0)
+        LootWeight.objects.create(location_type=self.cave, blueprint=self.sword, weight=0)
+        LootWeight.objects.create(location=self.mine, rarity=Item.Rarity.COMMON, weight=0)
+
+        woods_drops = self.roll_many(self.woods)
+        mine_drops = self.roll_many(self.mine)
+
+        self.assertEqual({d.blueprint for d in woods_drops}, {self.sword})
+        self.assertEqual({d.blueprint for d in mine_drops}, {self.gold})
+        self.assertNotIn(Item.Rarity.COMMON, {d.rarity for d in mine_drops})
+        self.assertIn(Item.Rarity.COMMON, {d.rarity for d in woods_drops})
+
+    def test_tables_are_compiled_once(self):
+        loot.get_loot_table(self.woods)
+
+        with self.assertNumQueries(0):
+            self.roll_many(self.woods)
+
+
+class LootSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+        self.inv = Inventory.objects.create(character=self.char, max_space=5)
+        self.wallet = Wallet.objects.create(character=self.char, gold=7)
+        self.gold = ItemBlueprint.objects.get(name="gold")
+        self.stone = ItemBlueprint.objects.create(
+            name="stone",
+            item_type=ItemBlueprint.ItemType.JUNK,
+            slot_type=ItemBlueprint.SlotType.INVENTORY,
+            is_stackable=True,
+        )
+        self.sword = ItemBlueprint.objects.create(
+            name="sword",
+            item_type=ItemBlueprint.ItemType.WEAPON,
+            slot_type=ItemBlueprint.SlotType.RIGHT,
+        )
+        location_type = LocationType.objects.create(name="forest")
+        self.location = Location.objects.create(name="Woods", type=location_type)
+
+    def test_drops_are_capped_by_free_space(self):
+        Item.objects.create(inventory=self.inv, blueprint=self.sword, rarity=Item.Rarity.RARE)
+        Inventory.objects.filter(pk=self.inv.pk).update(used_slots=1)
+        LootWeight.objects.create(blueprint=self.stone, weight=0)
+        LootWeight.objects.create(blueprint=self.gold, weight=0)
+
+        found = loot.search(self.char, self.location, times=10)
+
+        self.assertEqual(sum(f.amount for f in found), 4)
+        self.assertEqual(Item.objects.filter(inventory=self.inv).count(), 5)
+        self.assertEqual(Inventory.objects.get(pk=self.inv.pk).used_slots, 5)
+        with self.assertRaises(InventoryFullError):
+            loot.search(self.char, self.location)
+
+    def test_stackable_drops_are_merged_and_gold_goes_to_the_wallet(self):
+        LootWeight.objects.create(blueprint=self.sword, weight=0)
+        rng = random.Random(5)
+
+        found = dict(loot.search(self.char, self.location, times=5, rng=rng))
+
+        items = {i.blueprint_id: i.amount for i in Item.objects.filter(inventory=self.inv)}
+        self.assertEqual(set(items), {self.stone.id})
+        self.assertEqual(items[self.stone.id], found["stone"])
+        self.assertEqual(set(found), {"gold", "stone"})
+        self.assertEqual(wallet.balance(self.char.id), 7 + found["gold"])
+        self.assertEqual(Inventory.objects.get(pk=self.inv.pk).used_slots, 1)
+
+    def test_batch_query_count(self):
+        Item.objects.create(
+            inventory=self.inv, blueprint=self.stone, rarity=Item.Rarity.COMMON
+        )
+        loot.get_loot_table(self.location)
+
+        # inventory, savepoint, slots reservation, stacks, unused slots release,
+        # bulk insert, stacks update, wallet credit, ledger entry, release
+        with self.assertNumQueries(10):
+            loot.search(self.char, self.location, times=4, rng=random.Random(1))
+
+    def test_named_drop_is_a_single_insert(self):
+        LootWeight.objects.create(blueprint=self.stone, weight=0)
+        LootWeight.objects.create(blueprint=self.gold, weight=0)
+        loot.get_loot_table(self.location)
+
+        with CaptureQueriesContext(connection) as ctx:
+            found = loot.search(self.char, self.location)
+
+        item_writes = [
+            q["sql"].split()[0] for q in ctx.captured_queries
+            if q["sql"].startswith(("INSERT", "UPDATE")) and '"wwwhero_item"' in q["sql"].split("(")[0]
+        ]
+        self.assertEqual(item_writes, ["INSERT"])
+        self.assertEqual(Item.objects.get(inventory=self.inv).name, found[0].name)
+        self.assertIn("sword", found[0].name)
+
+
+class WalletTests(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+
+    def test_credit_is_one_update_and_one_insert(self):
+        Wallet.objects.create(character=self.char, gold=32767)
+
+        with self.assertNumQueries(2):
+            wallet.credit(self.char.id, 100000, GoldLedgerEntry.Reason.LOOT)
+
+        self.assertEqual(wallet.balance(self.char.id), 132767)
+
+    def test_credit_creates_missing_wallet(self):
+        wallet.credit(self.char.id, 5, GoldLedgerEntry.Reason.LOOT)
+        wallet.credit(self.char.id, 0, GoldLedgerEntry.Reason.LOOT)
+
+        self.assertEqual(Wallet.objects.get(character=self.char).gold, 5)
+
+    def test_ledger_adds_up_to_the_balance(self):
+        Wallet.objects.create(character=self.char)
+
+        for amount in (3, 4, 5):
+            wallet.credit(self.char.id, amount, GoldLedgerEntry.Reason.LOOT)
+
+        self.assertEqual(
+            sorted(GoldLedgerEntry.objects.filter(character=self.char).values_list("amount", flat=True)),
+            [3, 4, 5],
+        )
+        self.assertEqual(wallet.balance(self.char.id), 12)
+
+    def test_rolled_back_credit_leaves_no_entry(self):
+        Wallet.objects.create(character=self.char)
+
+        with self.assertRaises(ValueError), transaction.atomic():
+            wallet.credit(self.char.id, 3, GoldLedgerEntry.Reason.LOOT)
+            raise ValueError
+
+        self.assertEqual(wallet.balance(self.char.id), 0)
+        self.assertFalse(GoldLedgerEntry.objects.exists())
+
+
+class ItemNameTests(TestCase):
+    def test_name_is_reproducible(self):
+        names = {make_item_name("sword", Item.Rarity.EPIC, random.Random(3)) for _ in range(3)}
+
+        self.assertEqual(len(names), 1)
+        prefix, _ = names.pop().split(" sword")
+        self.assertIn(prefix, ("fancy", "epic", "brutal"))
+
+    def test_too_long_name_falls_back_to_blueprint_name(self):
+        name = "x" * (Item.MAX_NAME_LENGTH - 1)
+
+        self.assertEqual(make_item_name(name, Item.Rarity.COMMON), name)
+
+    def test_batch_naming_without_queries(self):
+        cache.clear()
+        sword = ItemBlueprint.objects.create(
+            name="sword",
+            item_type=ItemBlueprint.ItemType.WEAPON,
+            slot_type=ItemBlueprint.SlotType.RIGHT,
+        )
+        get_catalog()
+        items = [Item(blueprint_id=sword.id, rarity=rarity) for rarity in Item.Rarity]
+
+        with self.assertNumQueries(0):
+            Item.generate_names(items, rng=random.Random(1))
+
+        self.assertTrue(all("sword" in item.name for item in items))
+
+
+class CooldownCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+        self.level = CharacterCooldown.Type.LEVEL
+
+    def test_cold_cache_falls_back_to_db_once(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(cooldowns.get_until(self.char.id, self.level))
+        with self.assertNumQueries(0):
+            self.assertIsNone(cooldowns.get_until(self.char.id, self.level))
+
+    def test_writes_go_through_to_cache(self):
+        until = timezone.now() + timedelta(minutes=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            cooldown = CharacterCooldown.objects.create(
+                character=self.char, type=CharacterCooldown.Type.SEARCH, until=until
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cooldowns.get_until(self.char.id, cooldown.type), until)
+            self.assertGreater(cooldowns.remaining_seconds(self.char.id, cooldown.type), 290)
+
+        cooldown.delete()
+        self.assertIsNone(cooldowns.get_until(self.char.id, cooldown.type))
+
+    def test_expired_cooldown_is_not_active(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CharacterCooldown.objects.create(
+                character=self.char, type=self.level, until=timezone.now() - timedelta(seconds=1)
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cooldowns.remaining_seconds(self.char.id, self.level), 0)
+
+    def test_rolled_back_cooldown_is_not_cached(self):
+        cooldowns.get_until(self.char.id, self.level)
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            CharacterCooldown.objects.create(
+                character=self.char, type=self.level, until=timezone.now() + timedelta(minutes=5)
+            )
+            raise DatabaseError
+
+        self.assertIsNone(cooldowns.get_until(self.char.id, self.level))
+
+
+class ActiveCharacterTests(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+        self.attrs = CharacterAttributes.objects.create(character=self.char)
+        self.inv = Inventory.objects.create(character=self.char)
+        location_type = LocationType.objects.create(name="forest")
+        self.location = Location.objects.create(name="Woods", type=location_type)
+
+    def test_loads_everything_in_one_query(self):
+        CharacterSelection.objects.create(user=self.u, character=self.char)
+        CharacterLocation.objects.create(character=self.char, location=self.location)
+
+        with self.assertNumQueries(1):
+            active = load_active_character(self.u)
+            self.assertEqual(active.character, self.char)
+            self.assertEqual(active.attributes, self.attrs)
+            self.assertEqual(active.inventory, self.inv)
+            self.assertEqual(active.character_location.location, self.location)
+
+    def test_missing_location(self):
+        CharacterSelection.objects.create(user=self.u, character=self.char)
+
+        active = load_active_character(self.u)
+
+        self.assertTrue(active)
+        self.assertIsNone(active.character_location)
+
+    def test_no_selection(self):
+        self.assertFalse(load_active_character(self.u))
+
+    @override_settings(VISIT_COUNTER_MODE=visits.BUFFERED, VISIT_COUNTER_FLUSH_INTERVAL=0)
+    def test_loaded_once_per_request(self):
+        CharacterSelection.objects.create(user=self.u, character=self.char)
+        self.client.force_login(self.u)
+        self.addCleanup(visits.flush)
+
+        # session, user, active character
+        with self.assertNumQueries(3):
+            response = self.client.get("/story/")
+
+        self.assertRedirects(response, "/map/", fetch_redirect_response=False)
+
+
+class InventorySnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+        self.inv = Inventory.objects.create(character=self.char)
+        self.stone = ItemBlueprint.objects.create(
+            name="stone",
+            item_type=ItemBlueprint.ItemType.JUNK,
+            slot_type=ItemBlueprint.SlotType.INVENTORY,
+            is_stackable=True,
+            is_droppable=True,
+            description="Just a stone",
+        )
+        self.stones = Item.objects.create(
+            inventory=self.inv, blueprint=self.stone, rarity=Item.Rarity.COMMON,
+            name="stone", amount=3,
+        )
+        location_type = LocationType.objects.create(name="forest")
+        self.location = Location.objects.create(name="Woods", type=location_type)
+
+    def test_rows_carry_blueprint_fields(self):
+        row, = snapshots.get_rows(self.inv.id)
+
+        self.assertEqual((row.id, row.name, row.amount), (self.stones.id, "stone", 3))
+        self.assertTrue(row.is_stackable)
+        self.assertTrue(row.is_droppable)
+        self.assertEqual(row.description, "Just a stone")
+
+    def test_cached_snapshot_costs_no_queries(self):
+        snapshots.get_rows(self.inv.id)
+
+        with self.assertNumQueries(0):
+            snapshots.get_rows(self.inv.id)
+
+    def test_loot_replaces_snapshot_on_commit(self):
+        snapshots.get_rows(self.inv.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            found = loot.search(self.char, self.location, times=3, rng=random.Random(2))
+            self.assertEqual(len(snapshots.get_rows(self.inv.id)), 1)
+
+        self.assertEqual(
+            sorted((r.id, r.amount) for r in snapshots.get_rows(self.inv.id)),
+            sorted(Item.objects.filter(inventory=self.inv).values_list("id", "amount")),
+        )
+        self.assertTrue(found)
+
+    def test_rows_read_before_a_change_are_not_served_after_it(self):
+        stale_version = versions.get(snapshots._version_name(self.inv.id))
+        self.stones.delete()
+        snapshots.invalidate(self.inv.id)
+        # a rebuild that read the items before the delete committed and caches them after it
+        cache.set(snapshots._key(self.inv.id, stale_version, get_catalog()), ("stale",), snapshots.SNAPSHOT_TTL)
+
+        self.assertEqual(snapshots.get_rows(self.inv.id), ())
+
+    def test_blueprint_edit_replaces_snapshot(self):
+        snapshots.get_rows(self.inv.id)
+
+        self.stone.description = "A round stone"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stone.save()
+
+        self.assertEqual(snapshots.get_rows(self.inv.id)[0].description, "A round stone")
+
+
+class LoadTestCommandTests(TestCase):
+    def test_in_process_run(self):
+        cache.clear()
+        location_type = LocationType.objects.create(name="forest")
+        Location.objects.create(name="Woods", type=location_type, is_active=True)
+
+        with tempfile.NamedTemporaryFile("r", suffix=".json") as output:
+            call_command(
+                "loadtest", players=2, iterations=2, concurrency=1,
+                output=output.name, stdout=open(os.devnull, "w"),
+            )
+            results = json.load(output)
+
+        self.assertEqual(results["errors"], 0)
+        self.assertEqual(results["urls"]["character_loot"]["requests"], 4)
+        self.assertGreater(results["urls"]["map"]["queries_per_request"], 0)
+        self.assertEqual(User.objects.filter(username__startswith="loadtest-").count(), 2)
+
+    def test_in_process_asgi_run_compared_to_baseline(self):
+        cache.clear()
+        location_type = LocationType.objects.create(name="forest")
+        Location.objects.create(name="Woods", type=location_type, is_active=True)
+        out = io.StringIO()
+
+        with tempfile.NamedTemporaryFile("r", suffix=".json") as output:
+            call_command(
+                "loadtest", players=1, iterations=1, concurrency=1,
+                label="wsgi", output=output.name, stdout=open(os.devnull, "w"),
+            )
+            # the pool threads can't see the data of the test transaction
+            call_command(
+                "loadtest", players=1, iterations=1, concurrency=1, asgi=True, db_threads=0,
+                label="asgi", compare=output.name, stdout=out,
+            )
+
+        self.assertIn("wsgi -> asgi", out.getvalue())
+        self.assertRegex(out.getvalue(), r"map\s+1\s+0\s")
+
+
+class WarmUpTests(TestCase):
+    def test_caches_are_loaded(self):
+        cache.clear()
+        location_type = LocationType.objects.create(name="forest")
+        Location.objects.create(name="Woods", type=location_type, is_active=True)
+
+        timings = warmup.warm_up()
+
+        self.assertEqual(set(timings), {"templates", "urls", "reference data"})
+        with self.assertNumQueries(0):
+            get_catalog()
+            loot.get_loot_table(get_locations().active[0])
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        spawn = mock.patch.object(dbpool, "spawn")
+        self.spawn = spawn.start()
+        self.addCleanup(spawn.stop)
+        self.forest = LocationType.objects.create(name="forest")
+
+    def location(self, name, color="green"):
+        image = io.BytesIO()
+        Image.new("RGB", (2000, 1000), color).save(image, "PNG")
+
+        return Location.objects.create(
+            name=name, type=self.forest, image=SimpleUploadedFile(f"{name}.png", image.getvalue()),
+        )
+
+    def test_command_builds_the_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            location = self.location("Woods")
+        # not in the request that saved the image
+        self.assertNotIn(location.image.name, images.get_variants().by_source)
+
+        call_command("build_image_variants", processes=1, stdout=io.StringIO())
+
+        digest, widths = images.get_variants().by_source[location.image.name]
+        self.assertEqual(widths, (640, 1280, 1920))
+        with default_storage.open(f"variants/{digest}-640.webp") as file, Image.open(file) as variant:
+            self.assertEqual((variant.format, variant.size), ("WEBP", (640, 320)))
+        self.assertEqual(images.variant_url(location.image, 1000), f"/media/variants/{digest}-1280.webp")
+        self.assertEqual(images.variant_url(location.image, 4000), f"/media/variants/{digest}-1920.webp")
+        self.assertIn(f"/media/variants/{digest}-640.webp 640w", images.srcset(location.image))
+
+    def test_new_image_is_built_in_a_thread_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            location = self.location("Woods")
+            self.spawn.assert_not_called()
+
+        func, *args = self.spawn.call_args[0]
+        self.assertEqual(args, [location.image.name, (640, 1280, 1920)])
+        func(*args)
+        self.assertIn(location.image.name, images.get_variants().by_source)
+
+        # known sources and saves of other fields don't build again
+        with self.captureOnCommitCallbacks(execute=True):
+            location.save()
+            location.save(update_fields=["name"])
+        self.assertEqual(self.spawn.call_count, 1)
+
+    def test_command_records_the_images_that_built(self):
+        woods = self.location("Woods")
+        broken = self.location("Caves")
+        with default_storage.open(broken.image.name, "wb") as file:
+            file.write(b"not an image")
+        out, err = io.StringIO(), io.StringIO()
+
+        with self.assertRaisesMessage(CommandError, "1 images failed"):
+            call_command("build_image_variants", processes=1, stdout=out, stderr=err)
+
+        self.assertEqual(out.getvalue(), "1 images got variants\n")
+        self.assertIn(f"{broken.image.name}: UnidentifiedImageError", err.getvalue())
+        self.assertEqual(list(images.get_variants().by_source), [woods.image.name])
+
+    def test_images_without_variants_are_not_shown(self):
+        location = self.location("Woods")
+
+        self.assertEqual(images.variant_url(location.image, 640), "")
+        self.assertEqual(images.srcset(location.image), "")
+
+    def test_command_builds_missing_variants_in_a_process_pool(self):
+        self.location("Woods")
+        self.location("Caves", color="grey")
+        out = io.StringIO()
+
+        call_command("build_image_variants", processes=2, stdout=out)
+        call_command("build_image_variants", processes=2, stdout=out)
+
+        self.assertEqual(out.getvalue().splitlines(), ["2 images got variants", "0 images got variants"])
+        self.assertEqual(len(images.get_variants().by_source), 2)
+
+    def test_variants_are_served_immutable(self):
+        location = self.location("Woods")
+        call_command("build_image_variants", processes=1, stdout=io.StringIO())
+
+        response = self.client.get(images.variant_url(location.image, 640))
+
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn(f"max-age={images.IMMUTABLE_MAX_AGE}", response["Cache-Control"])
+        self.assertEqual(self.client.get("/media/variants/0123456789abcdef-1.webp").status_code, 404)
+        self.assertEqual(self.client.get("/media/variants/..%2Fsecret").status_code, 404)
+
+
+class VisitRollupTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f"player{i}") for i in range(3)]
+        self.now = timezone.now().replace(hour=10, minute=30)
+
+    def visit(self, user, url, views):
+        visit, _ = UserVisit.objects.get_or_create(user=user, url=url, method="GET")
+        UserVisit.objects.filter(pk=visit.pk).update(view=F("view") + views)
+
+    def hourly(self):
+        return set(HourlyVisitRollup.objects.values_list("url", "hour", "views"))
+
+    def test_views_are_summed_into_the_buckets_of_the_run(self):
+        for user in self.users:
+            self.visit(user, "/", 2)
+        self.visit(self.users[0], "/map/", 1)
+        hour = self.now.replace(minute=0, second=0, microsecond=0)
+
+        self.assertEqual(rollups.roll_up(self.now, chunk_size=2)[:2], (4, 7))
+        self.assertEqual(rollups.roll_up(self.now)[:2], (0, 0))
+        self.visit(self.users[1], "/", 5)
+        rollups.roll_up(self.now + timedelta(hours=1))
+
+        self.assertEqual(self.hourly(), {
+            ("/", hour, 6), ("/map/", hour, 1), ("/", hour + timedelta(hours=1), 5),
+        })
+        self.assertEqual(
+            set(DailyVisitRollup.objects.values_list("url", "day", "views")),
+            {("/", self.now.date(), 11), ("/map/", self.now.date(), 1)},
+        )
+        self.assertFalse(UserVisit.objects.filter(view__gt=F("last_rolled_view")).exists())
+
+    def test_command_rolls_up_the_pending_views(self):
+        self.visit(self.users[0], "/", 3)
+        out, err = io.StringIO(), io.StringIO()
+
+        call_command("rollup_visits", chunk_size=1, stdout=out, stderr=err)
+
+        self.assertEqual(out.getvalue().strip(), "3 views of 1 visit counters rolled up")
+        self.assertEqual(err.getvalue(), "")
+        self.assertEqual(HourlyVisitRollup.objects.get().views, 3)
+        self.assertEqual(VisitRollupRun.objects.get().views, 3)
+
+    def test_command_warns_about_skipped_hours(self):
+        VisitRollupRun.objects.create(started_at=timezone.now() - timedelta(hours=3), visits=0, views=0)
+        err = io.StringIO()
+
+        call_command("rollup_visits", stdout=io.StringIO(), stderr=err)
+
+        self.assertIn("Run the command every hour", err.getvalue())
+
+    def test_skipped_hours(self):
+        self.assertFalse(rollups.skips_hours(None, self.now))
+        self.assertFalse(rollups.skips_hours(self.now - timedelta(minutes=59), self.now))
+        self.assertFalse(rollups.skips_hours(self.now.replace(minute=0) - timedelta(minutes=50), self.now))
+        self.assertTrue(rollups.skips_hours(self.now - timedelta(hours=2), self.now))
+
+    def test_counters_go_past_the_small_integer_range(self):
+        self.visit(self.users[0], "/", 40000)
+
+        rollups.roll_up(self.now)
+
+        self.assertEqual(UserVisit.objects.get().last_rolled_view, 40000)
+        self.assertEqual(HourlyVisitRollup.objects.get().views, 40000)
+
+
+class ExplainHotQueriesCommandTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = io.StringIO()
+
+        call_command("explain_hot_queries", players=20, items=5, stdout=out)
+
+        self.assertNotIn("SEQUENTIAL SCAN", out.getvalue())
+        self.assertIn("inventory stacks: ok", out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith="explain-").exists())
+
+
+# the manifest only exists after collectstatic
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="secret")
+        self.client.force_login(self.admin)
+        self.blueprint = ItemBlueprint.objects.create(
+            name="sword",
+            item_type=ItemBlueprint.ItemType.WEAPON,
+            slot_type=ItemBlueprint.SlotType.RIGHT,
+        )
+
+    def items(self, count):
+        user = User.objects.create(username=f"player{count}")
+        character = Character.objects.create(user=user, name="Hero")
+        inventory = Inventory.objects.create(character=character)
+        Item.objects.bulk_create([
+            Item(blueprint=self.blueprint, inventory=inventory, rarity=Item.Rarity.COMMON) for _ in range(count)
+        ])
+
+        return list(Item.objects.filter(inventory=inventory).order_by("-id").values_list("id", flat=True))
+
+    def test_changelists_render(self):
+        self.items(3)
+
+        for model in admin.site._registry:
+            if model._meta.app_label != "wwwhero":
+                continue
+            with self.subTest(model=model.__name__):
+                url = reverse(f"admin:wwwhero_{model._meta.model_name}_changelist")
+                self.assertEqual(self.client.get(url).status_code, 200)
+                self.assertEqual(self.client.get(url, {"q": "player3"}).status_code, 200)
+
+    def test_item_changelist_pages_by_id_without_counting(self):
+        ids = self.items(5)
+        url = reverse("admin:wwwhero_item_changelist")
+
+        with mock.patch.object(ItemAdmin, "list_per_page", 2):
+            with CaptureQueriesContext(connection) as queries:
+                first = self.client.get(url)
+            older = self.client.get(url + first.context["cl"].older_url)
+            last = self.client.get(url, {"before": ids[3]})
+
+        self.assertEqual([item.id for item in first.context["cl"].result_list], ids[:2])
+        self.assertEqual([item.id for item in older.context["cl"].result_list], ids[2:4])
+        self.assertEqual([item.id for item in last.context["cl"].result_list], ids[4:])
+        self.assertContains(first, "Older")
+        self.assertIsNone(last.context["cl"].next_before)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries.captured_queries))
+        self.assertEqual(self.client.get(url, {"before": "x"}).status_code, 302)
+
+    def test_item_changelist_queries_dont_grow_with_rows(self):
+        url = reverse("admin:wwwhero_item_changelist")
+        self.items(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        self.items(30)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+
+        self.assertEqual(len(many), len(few))
+
+    def test_estimated_count_of_unfiltered_tables(self):
+        self.items(3)
+
+        with mock.patch("wwwhero.admin_paging.estimated_row_count", return_value=2_000_000):
+            self.assertEqual(EstimatedCountPaginator(Item.objects.order_by("id"), 100).count, 2_000_000)
+            self.assertEqual(EstimatedCountPaginator(Item.objects.filter(amount=1).order_by("id"), 100).count, 3)
+        with mock.patch("wwwhero.admin_paging.estimated_row_count", return_value=50):
+            self.assertEqual(EstimatedCountPaginator(Item.objects.order_by("id"), 100).count, 3)
+
+
+@override_settings(VISIT_COUNTER_MODE=visits.BUFFERED, VISIT_COUNTER_FLUSH_INTERVAL=0)
+class LocationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(visits.flush)
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan", level=2)
+        Inventory.objects.create(character=self.char)
+        CharacterSelection.objects.create(user=self.u, character=self.char)
+        location_type = LocationType.objects.create(name="forest")
+        self.woods = Location.objects.create(name="Woods", type=location_type, is_active=True)
+        self.peak = Location.objects.create(
+            name="Peak", type=location_type, is_active=True, min_level=5
+        )
+        self.hidden = Location.objects.create(name="Hidden", type=location_type)
+        self.client.force_login(self.u)
+
+    def test_unlocked_locations(self):
+        catalog = get_locations()
+
+        self.assertEqual(catalog.active, (self.woods, self.peak))
+        self.assertEqual(catalog.unlocked(2), (self.woods,))
+
+    def test_map_is_served_from_cache(self):
+        first = self.client.get("/map/")
+
+        # session, user, active character
+        with self.assertNumQueries(3):
+            second = self.client.get("/map/")
+
+        self.assertEqual(first.content, second.content)
+        self.assertContains(second, "Minimum level is 5")
+        self.assertNotContains(second, "Hidden")
+
+    def test_map_is_invalidated_on_location_save(self):
+        self.client.get("/map/")
+
+        self.hidden.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hidden.save()
+
+        self.assertContains(self.client.get("/map/"), "Hidden")
+
+    def test_location_select_checks_cached_location(self):
+        get_locations()
+
+        response = self.client.get(f"/locations/{self.peak.id}/")
+        self.assertRedirects(response, "/map/", fetch_redirect_response=False)
+        response = self.client.get(f"/locations/{self.hidden.id}/")
+        self.assertRedirects(response, "/map/", fetch_redirect_response=False)
+        self.assertEqual(self.client.get("/locations/999/").status_code, 404)
+
+        response = self.client.get(f"/locations/{self.woods.id}/")
+        self.assertRedirects(response, "/story/", fetch_redirect_response=False)
+        self.assertEqual(CharacterLocation.objects.get(character=self.char).location, self.woods)
+
+
+@override_settings(VISIT_COUNTER_MODE=visits.BUFFERED, VISIT_COUNTER_FLUSH_INTERVAL=0)
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(visits.flush)
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+        CharacterAttributes.objects.create(character=self.char)
+        self.inv = Inventory.objects.create(character=self.char, max_space=5, used_slots=1)
+        Wallet.objects.create(character=self.char, gold=40000)
+        CharacterSelection.objects.create(user=self.u, character=self.char)
+        location_type = LocationType.objects.create(name="forest")
+        location = Location.objects.create(name="Woods", type=location_type, is_active=True)
+        CharacterLocation.objects.create(character=self.char, location=location)
+        self.stone = ItemBlueprint.objects.create(
+            name="stone",
+            item_type=ItemBlueprint.ItemType.JUNK,
+            slot_type=ItemBlueprint.SlotType.INVENTORY,
+            is_stackable=True,
+            is_droppable=True,
+        )
+        self.stones = Item.objects.create(
+            inventory=self.inv, blueprint=self.stone, rarity=Item.Rarity.COMMON,
+            name="stone", amount=3,
+        )
+        self.client.force_login(self.u)
+
+    def test_requires_login(self):
+        self.client.logout()
+
+        response = self.client.get("/api/character/state")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {"error": "Authentication required"})
+
+    def test_state(self):
+        state = self.client.get("/api/character/state").json()
+
+        self.assertEqual(state["character"]["level"], 1)
+        self.assertEqual(state["character"]["attributes"]["hp"], 10)
+        self.assertEqual(state["character"]["location"], "Woods")
+        self.assertEqual(state["cooldowns"], {"level": 0})
+        self.assertEqual(state["inventory"], {"used": 1, "max_space": 5})
+        self.assertEqual(state["gold"], 40000)
+
+    def test_inventory_rows(self):
+        inventory = self.client.get("/api/inventory").json()
+
+        item = dict(zip(inventory["fields"], inventory["items"][0]))
+        self.assertEqual(item["id"], self.stones.id)
+        self.assertEqual(item["amount"], 3)
+        self.assertTrue(item["is_stackable"])
+
+    def test_level_up(self):
+        response = self.client.post("/api/character/levelup")
+
+        result = response.json()
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["character"]["level"], 2)
+        self.assertNotEqual(result["character"]["attributes"]["hp"], 10)
+        self.assertGreater(result["cooldowns"]["level"], 0)
+        self.assertEqual(result["inventory"]["max_space"], 6)
+
+        response = self.client.post("/api/character/levelup")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()["ok"])
+
+    def test_actions_require_post(self):
+        self.assertEqual(self.client.get("/api/character/levelup").status_code, 405)
+
+    def test_drop(self):
+        # the snapshot is replaced on commit, after the response in tests
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.post(f"/api/inventory/drop/{self.stones.id}").json()["ok"])
+
+        inventory = self.client.get("/api/inventory").json()
+        self.assertEqual(dict(zip(inventory["fields"], inventory["items"][0]))["amount"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/inventory/drop/{self.stones.id}", {"all": "all"})
+
+        self.assertEqual(self.client.get("/api/inventory").json()["items"], [])
+        self.assertEqual(self.client.post("/api/inventory/drop/999").status_code, 404)
+
+    def test_loot(self):
+        ItemBlueprint.objects.create(
+            name="sword",
+            item_type=ItemBlueprint.ItemType.WEAPON,
+            slot_type=ItemBlueprint.SlotType.RIGHT,
+        )
+        LootWeight.objects.create(blueprint=self.stone, weight=0)
+        LootWeight.objects.create(blueprint=ItemBlueprint.objects.get(name="gold"), weight=0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/character/loot", {"times": 10})
+
+        self.assertTrue(response.json()["ok"])
+        self.assertEqual(response.json()["gold"], 40000)
+        # the snapshot is replaced on commit, after the response in tests
+        self.assertEqual(self.client.get("/api/inventory").json()["used"], 5)
+
+        response = self.client.post("/api/character/loot")
+
+        self.assertEqual(response.status_code, 409)
+
+
+@override_settings(
+    SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies",
+    MESSAGE_STORAGE="django.contrib.messages.storage.cookie.CookieStorage",
+)
+class SignedCookieSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+        CharacterAttributes.objects.create(character=self.char)
+        Inventory.objects.create(character=self.char)
+        location_type = LocationType.objects.create(name="forest")
+        location = Location.objects.create(name="Woods", type=location_type, is_active=True)
+        CharacterLocation.objects.create(character=self.char, location=location)
+        self.client.force_login(self.u)
+
+    def test_game_flow_never_touches_the_session_table(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertRedirects(self.client.get(f"/characters/{self.char.id}/"), "/story/")
+            self.client.get("/character/levelup/")
+            response = self.client.get("/character/detail/")
+
+        self.assertContains(response, "Congrats!")
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if "django_session" in q["sql"]])
+
+
+@override_settings(VISIT_COUNTER_MODE=visits.BUFFERED, VISIT_COUNTER_FLUSH_INTERVAL=0)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(visits.flush)
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+        CharacterAttributes.objects.create(character=self.char)
+        Inventory.objects.create(character=self.char)
+        CharacterSelection.objects.create(user=self.u, character=self.char)
+        location_type = LocationType.objects.create(name="forest")
+        self.location = Location.objects.create(name="Woods", type=location_type, is_active=True)
+        CharacterLocation.objects.create(character=self.char, location=self.location)
+        self.client.force_login(self.u)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_page_is_not_modified(self):
+        for url in ("/", "/story/", "/character/detail/"):
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertIn("Last-Modified", response)
+                self.assertIn("private", response["Cache-Control"])
+
+                # session, user, active character
+                with self.assertNumQueries(3):
+                    response = self.revalidate(url, response["ETag"])
+
+                self.assertEqual(response.status_code, 304)
+
+    def test_state_changes_invalidate(self):
+        etag = self.client.get("/character/detail/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.char.level_up()
+
+        self.assertEqual(self.revalidate("/character/detail/", etag).status_code, 200)
+
+    def test_etag_follows_the_character_shown(self):
+        other = Character.objects.create(user=self.u, name="Other")
+        CharacterAttributes.objects.create(character=other)
+        Inventory.objects.create(character=other)
+        etag = self.client.get("/character/detail/")["ETag"]
+
+        # selected in another session
+        CharacterSelection.objects.filter(user=self.u).update(character=other)
+        response = self.revalidate("/character/detail/", etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Other")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.level_up()
+        self.assertEqual(self.revalidate("/character/detail/", response["ETag"]).status_code, 200)
+
+    def test_stamps_are_bumped_on_commit(self):
+        etag = self.client.get("/").get("ETag")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Character.objects.create(user=self.u, name="Other")
+            self.assertEqual(self.revalidate("/", etag).status_code, 304)
+
+        self.assertEqual(self.revalidate("/", etag).status_code, 200)
+
+    def test_catalog_changes_invalidate(self):
+        for name in (CATALOG_VERSION_NAME, LOCATIONS_VERSION_NAME, images.VERSION_NAME):
+            with self.subTest(name):
+                etag = self.client.get("/character/detail/")["ETag"]
+
+                versions.bump(name)
+
+                self.assertEqual(self.revalidate("/character/detail/", etag).status_code, 200)
+
+    def test_other_character_invalidates_index(self):
+        etag = self.client.get("/")["ETag"]
+        story_etag = self.client.get("/story/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Character.objects.create(user=self.u, name="Other")
+
+        self.assertEqual(self.revalidate("/", etag).status_code, 200)
+        self.assertEqual(self.revalidate("/story/", story_etag).status_code, 200)
+
+    def test_location_change_invalidates(self):
+        etag = self.client.get("/story/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f"/locations/{self.location.id}/")
+        response = self.revalidate("/story/", etag)
+
+        # the page shows the new flash message
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertNotEqual(self.client.get("/story/")["ETag"], etag)
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_several_workers_want_a_shared_cache(self):
+        self.assertEqual(checks.check_shared_cache(1), [])
+        self.assertEqual([warning.id for warning in checks.check_shared_cache(4)], ["wwwhero.W001"])
+
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache"}}):
+            self.assertEqual(checks.check_shared_cache(4), [])
+
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "3"}):
+            self.assertEqual([warning.id for warning in checks.shared_cache(None)], ["wwwhero.W001"])
+
+    def test_stamps_expire(self):
+        with mock.patch("wwwhero.versions.time.time", return_value=1.0):
+            versions.bump("test")
+            self.assertEqual(versions.get("test"), 1.0)
+
+            with override_settings(VERSION_STAMP_TTL=0):
+                versions.bump("test")
+        self.assertNotEqual(versions.get("test"), 1.0)
+
+
+class InventorySlotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user(username="Bob", password="strong!1")
+        self.char = Character.objects.create(user=self.u, name="Dylan")
+        self.inv = Inventory.objects.create(character=self.char, max_space=3, used_slots=1)
+        self.sword = ItemBlueprint.objects.create(
+            name="sword",
+            item_type=ItemBlueprint.ItemType.WEAPON,
+            slot_type=ItemBlueprint.SlotType.RIGHT,
+            is_droppable=True,
+        )
+
+    def test_reserve_is_a_conditional_update(self):
+        stale = Inventory.objects.get(pk=self.inv.pk)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(self.inv.reserve_slots(2))
+        self.assertFalse(stale.reserve_slots(1))
+
+        self.assertEqual(Inventory.objects.get(pk=self.inv.pk).used_slots, 3)
+
+    def test_drop_frees_a_slot(self):
+        item = Item.objects.create(inventory=self.inv, blueprint=self.sword, rarity=Item.Rarity.RARE)
+
+        actions.drop(self.inv, item.id)
+
+        self.assertEqual(self.inv.used_slots, 0)
+        self.assertEqual(Inventory.objects.get(pk=self.inv.pk).used_slots, 0)
+
+    def test_concurrent_drops_free_one_slot(self):
+        item = Item.objects.create(inventory=self.inv, blueprint=self.sword, rarity=Item.Rarity.RARE)
+        # both requests read the item before either dropped it
+        stale = Inventory.objects.get(pk=self.inv.pk)
+        with mock.patch("wwwhero.actions.get_object_or_404", return_value=Item.objects.get(pk=item.pk)):
+            actions.drop(self.inv, item.id)
+            with self.assertRaises(Http404):
+                actions.drop(stale, item.id)
+
+        self.assertEqual(Inventory.objects.get(pk=self.inv.pk).used_slots, 0)
+
+    def test_stack_drop_keeps_concurrent_increments(self):
+        stone = ItemBlueprint.objects.create(
+            name="stone",
+            item_type=ItemBlueprint.ItemType.JUNK,
+            slot_type=ItemBlueprint.SlotType.INVENTORY,
+            is_stackable=True,
+            is_droppable=True,
+        )
+        stones = Item.objects.create(inventory=self.inv, blueprint=stone, rarity=Item.Rarity.COMMON, amount=3)
+        read = Item.objects.get(pk=stones.pk)
+        # a loot merges two stones after the drop read the stack
+        Item.objects.filter(pk=stones.pk).update(amount=F("amount") + 2)
+
+        with mock.patch("wwwhero.actions.get_object_or_404", return_value=read):
+            actions.drop(self.inv, stones.id)
+
+        self.assertEqual(Item.objects.get(pk=stones.pk).amount, 4)
+
+    def test_repair_command(self):
+        Item.objects.create(inventory=self.inv, blueprint=self.sword, rarity=Item.Rarity.RARE)
+        Item.objects.create(inventory=self.inv, blueprint=self.sword, rarity=Item.Rarity.RARE)
+        empty = Inventory.objects.create(character=self.char, used_slots=4)
+        out = io.StringIO()
+
+        call_command("repair_inventory_slots", dry_run=True, stdout=out)
+        self.assertIn("2 inventories to repair", out.getvalue())
+        self.assertEqual(Inventory.objects.get(pk=empty.pk).used_slots, 4)
+
+        call_command("repair_inventory_slots", stdout=out)
+
+        self.assertEqual(Inventory.objects.get(pk=self.inv.pk).used_slots, 2)
+        self.assertEqual(Inventory.objects.get(pk=empty.pk).used_slots, 0)
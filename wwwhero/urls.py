@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, images, views
 
 urlpatterns = [
     path("", views.index, name="index"),
@@ -9,6 +9,7 @@ urlpatterns = [
     path("character/create/", views.character_create_view, name="character_create"),
     path("character/levelup/", views.character_level_up, name="character_level_up"),
     path("character/loot/", views.character_loot, name="character_loot"),
+    path("character/loot/<int:times>/", views.character_loot, name="character_loot_batch"),
     path("inventory/drop/<int:item_id>/", views.inventory_drop, name="inventory_drop"),
     path("inventory/drop/<int:item_id>/<drop_all>", views.inventory_drop, name="inventory_drop_all"),
     path("map/", views.map_view, name="map"),
@@ -17,4 +18,11 @@ urlpatterns = [
     path("accounts/signup/", views.signup_view, name="signup"),
     path("accounts/login/", views.login_view, name="login"),
     path("accounts/logout/", views.logout_view, name="logout"),
+    path("media/variants/<str:name>", images.variant_view, name="image_variant"),
+    path("api/character/state", api.character_state, name="api_character_state"),
+    path("api/character/cooldowns", api.character_cooldowns, name="api_character_cooldowns"),
+    path("api/character/levelup", api.character_level_up, name="api_character_level_up"),
+    path("api/character/loot", api.character_loot, name="api_character_loot"),
+    path("api/inventory", api.inventory, name="api_inventory"),
+    path("api/inventory/drop/<int:item_id>", api.inventory_drop, name="api_inventory_drop"),
 ]
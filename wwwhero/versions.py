@@ -0,0 +1,71 @@
+"""Version stamps shared by all worker processes through Django's cache.
+
+A stamp is the wall-clock time of the last bump, so it also tells when
+the versioned data last changed. A missing key (cold or cleared cache)
+gets a fresh stamp, which makes every process-local copy stale. Stamps
+expire after ``settings.VERSION_STAMP_TTL`` seconds, so a process that
+can't see the bumps of the others, as with a process-local cache backend,
+still serves stale data for that long at most.
+``VersionedValue`` keeps such a copy.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _key(name):
+    return f"wwwhero:version:{name}"
+
+
+def get(name):
+    key = _key(name)
+    version = cache.get(key)
+    if version is None:
+        version = time.time()
+        if not cache.add(key, version, settings.VERSION_STAMP_TTL):
+            # another process got there first
+            version = cache.get(key, version)
+
+    return version
+
+
+def bump(name):
+    version = time.time()
+    cache.set(_key(name), version, settings.VERSION_STAMP_TTL)
+
+    return version
+
+
+class VersionedValue:
+    """A process-local value, rebuilt when one of its version stamps changes.
+
+    ``loader(version)`` builds the value from the database; ``version`` is
+    the stamp of ``names``, or a tuple of the stamps when there are several.
+    Readers check the stamps on every ``get()``, one cache read each, and
+    only one thread rebuilds a stale value.
+    """
+
+    def __init__(self, names, loader):
+        self._names = (names,) if isinstance(names, str) else tuple(names)
+        self._loader = loader
+        self._lock = threading.Lock()
+        # (version, value), replaced as a whole so readers never see a mix
+        self._current = None
+
+    def version(self):
+        stamps = tuple(get(name) for name in self._names)
+
+        return stamps[0] if len(stamps) == 1 else stamps
+
+    def get(self):
+        version = self.version()
+        current = self._current
+        if current is None or current[0] != version:
+            with self._lock:
+                current = self._current
+                if current is None or current[0] != version:
+                    current = self._current = (version, self._loader(version))
+
+        return current[1]
@@ -1,46 +1,50 @@
-import random
+import math
 
+from django.conf import settings
 from django.db import transaction
-from django.db.models import F
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
 
+from wwwhero import actions, conditional, cooldowns, dbpool, snapshots
+from wwwhero.locations import get_locations
 from wwwhero.models import (
     Character,
     CharacterAttributes,
     CharacterCooldown,
     CharacterLocation,
     CharacterSelection,
-    Location,
-    UserVisit, Item, ItemBlueprint, Inventory,
+    Inventory,
+    Wallet,
 )
 from wwwhero.forms import CharacterCreateForm
-from wwwhero.exceptions import LevelUpCooldownError, MaxLevelError
+from wwwhero.visits import count_user_visit, defer_user_visit
 
 
+@dbpool.pooled_view
 def index(request):
-    count_user_visit(request)
+    defer_user_visit(request)
+    response = conditional.not_modified(request)
+    if response:
+        return response
     context = {}
 
     user = request.user
     if request.user.is_authenticated:
         characters = Character.objects.filter(user=user).order_by("-updated_at")
-        character_id = request.session.get("character_id")
-        selected_char = Character.objects.filter(id=character_id).first()
-        location = CharacterLocation.objects.filter(character_id=character_id).first()
+        active = request.active_character
 
         context = {
             "characters": characters,
-            "selected_char": selected_char,
-            "location": location,
+            "selected_char": active.character,
+            "location": active.character_location,
         }
 
-    return render(request, "wwwhero/index.html", context)
+    return conditional.add_validators(request, render(request, "wwwhero/index.html", context))
 
 
 @login_required
@@ -58,7 +62,6 @@ def character_select(request, character_id):
         user=user,
         defaults={"character": character}
     )
-    request.session["character_id"] = character.id
 
     if CharacterLocation.objects.filter(character=character).first():
         return redirect("story")
@@ -66,50 +69,54 @@ def character_select(request, character_id):
     return redirect("map")
 
 
+@dbpool.pooled_view
 @login_required
 def character_detail_view(request):
-    count_user_visit(request)
+    defer_user_visit(request)
+    response = conditional.not_modified(request)
+    if response:
+        return response
 
-    user = request.user
-    character = get_object_or_404(CharacterSelection, user=user).character
-    inventory = Inventory.objects.get(character=character)
-    items = Item.objects.filter(inventory=inventory)
+    active = _get_active_character(request)
+    character = active.character
+    inventory = active.inventory
+    items = snapshots.get_rows(inventory.id)
 
-    attributes = CharacterAttributes.objects.get(character=character)
-    cooldown = CharacterCooldown.objects.filter(
-        character=character,
-        type=CharacterCooldown.Type.LEVEL,
-    ).first()
-    if cooldown and cooldown.until > timezone.now():
-        cooldown_until = cooldown.until - timezone.now()
-        cooldown_until = cooldown_until.seconds + 1  # round to the next second
-    else:
-        cooldown_until = 0
+    attributes = active.attributes
+    cooldown_until = cooldowns.get_until(character.id, CharacterCooldown.Type.LEVEL)
 
     context = {
         "character": character,
         "attributes": attributes,
-        "cooldown_s": cooldown_until,
+        # the page may be served again with a 304, so the timer counts to a point in time
+        "cooldown_until": math.ceil(cooldown_until.timestamp()) if cooldown_until else 0,
         "items": items,
         "inventory": inventory,
+        "gold": active.wallet.gold if active.wallet else 0,
     }
 
-    return render(request, "wwwhero/character_detail.html", context)
+    return conditional.add_validators(request, render(request, "wwwhero/character_detail.html", context))
 
 
+@dbpool.pooled_view
 @login_required
 def map_view(request):
-    count_user_visit(request)
+    defer_user_visit(request)
 
-    character = get_object_or_404(CharacterSelection, user=request.user).character
-
-    locations = Location.objects.filter(is_active=True).order_by("min_level")
-    character_location = CharacterLocation.objects.filter(character=character).first()
+    active = _get_active_character(request)
+    character = active.character
+    catalog = get_locations()
+    unlocked = catalog.unlocked(character.level)
+    character_location = active.character_location
 
     context = {
         "character_location": character_location,
-        "locations": locations,
-        "character_level": character.level
+        "locations": catalog.active,
+        "character_level": character.level,
+        "locations_version": catalog.version,
+        "unlocked_ids": ",".join(str(location.id) for location in unlocked),
+        "current_location_id": character_location.location_id if character_location else None,
+        "map_cache_timeout": settings.MAP_FRAGMENT_CACHE_TIMEOUT,
     }
 
     return render(request, "wwwhero/map.html", context)
@@ -117,8 +124,10 @@ def map_view(request):
 
 @login_required
 def location_select(request, location_id):
-    character = get_object_or_404(CharacterSelection, user=request.user).character
-    location = get_object_or_404(Location, id=location_id)
+    character = _get_active_character(request).character
+    location = get_locations().by_id.get(location_id)
+    if location is None:
+        raise Http404("No such location")
 
     if not location.is_active or character.level < location.min_level:
         messages.error(request, "Your are not allowed to go here :(")
@@ -133,178 +142,57 @@ def location_select(request, location_id):
     return redirect("story")
 
 
+@dbpool.pooled_view
 @login_required
 def story_view(request):
-    count_user_visit(request)
+    defer_user_visit(request)
+    response = conditional.not_modified(request)
+    if response:
+        return response
 
-    character_id = request.session.get("character_id")
-    if not character_id:
+    active = request.active_character
+    if not active:
         messages.warning(request, "Please, select or create a new character")
         return redirect("index")
 
-    character_location = CharacterLocation.objects.filter(character_id=character_id).first()
+    character_location = active.character_location
     if not character_location:
         messages.warning(request, "Please, select place to go on the map")
         return redirect("map")
 
     context = {"character_location": character_location}
 
-    return render(request, "wwwhero/story.html", context)
+    return conditional.add_validators(request, render(request, "wwwhero/story.html", context))
 
 
 @login_required
 def character_level_up(request):
     count_user_visit(request)
 
-    user = request.user
-    selected_char = get_object_or_404(CharacterSelection, user=user)
-    character = selected_char.character
-
-    try:
-        character.level_up()
-        messages.success(request, f"Congrats! Now you're level {character.level}.")
-    except LevelUpCooldownError:
-        messages.error(request, "Nice try, but no! You have a level up cooldown.")
-    except MaxLevelError:
-        messages.error(
-            request,
-            f"You are too strong already. Max level {character.MAX_LEVEL} reached."
-        )
+    outcome = actions.level_up(_get_active_character(request).character)
+    _flash(request, outcome)
 
     return redirect("character_detail")
 
 
 @login_required
-def character_loot(request):
+def character_loot(request, times=1):
     count_user_visit(request)
 
-    user = request.user
-    character = get_object_or_404(CharacterSelection, user=user).character
-    cur_location = get_object_or_404(CharacterLocation, character=character)
-    inventory = Inventory.objects.get(character=character)
-    items = Item.objects.filter(inventory=inventory)
-    blueprints = ItemBlueprint.objects.all()
-    amount = 1
-
-    if items.count() >= inventory.max_space:
-        messages.error(request, "Too many items, throw away something or level up")
-
-        return redirect("character_detail")
-
-    blueprint: ItemBlueprint = random.choice(blueprints)
-    if blueprint.item_type == ItemBlueprint.ItemType.GOLD:
-        item, amount = _update_gold(inventory)
-    elif ItemBlueprint.ItemType.QUEST == blueprint.item_type:
-        item, created = Item.objects.get_or_create(
-            inventory=inventory,
-            blueprint=blueprint,
-            defaults={
-                "rarity": Item.Rarity.LEGENDARY,
-                "name": blueprint.name,
-            }
-
-        )
-        if not created:
-            item, amount = _update_gold(inventory)
-    else:
-        min_damage, max_damage = 0, 0
-
-        rarity_weight = {
-            Item.Rarity.COMMON: 20,
-            Item.Rarity.UNCOMMON: 10,
-            Item.Rarity.RARE: 5,
-            Item.Rarity.EPIC: 2,
-            Item.Rarity.LEGENDARY: 1,
-        }
-        rarities = []
-        for k, v in rarity_weight.items():
-            for i in range(v):
-                rarities.append(k)
-        rarity = random.choice(rarities)
-        location_level = cur_location.location.min_level
-        item_level = random.randint(location_level - 1, location_level + 1) or 1
-
-        if blueprint.item_type == ItemBlueprint.ItemType.WEAPON:
-            level_plus_rarity = item_level + rarity
-            min_damage = random.randint(
-                level_plus_rarity,
-                item_level * rarity + random.randint(1, item_level)
-            )
-            max_damage = random.randint(
-                min_damage,
-                min_damage + random.randint(1, level_plus_rarity * 2)
-            )
-        if blueprint.is_stackable:
-            item, created = Item.objects.get_or_create(
-                inventory=inventory,
-                blueprint=blueprint,
-                defaults={
-                    "rarity": Item.Rarity.COMMON,
-                    "name": blueprint.name,
-                }
-            )
-
-            if not created:
-                item.amount += 1
-                item.save(update_fields=["amount"])
-        else:
-            item = Item.objects.create(
-                inventory=inventory,
-                blueprint=blueprint,
-                min_damage=min_damage,
-                max_damage=max_damage,
-                rarity=rarity,
-                level=item_level,
-                cost=item_level * rarity * blueprint.base_cost
-            )
-            item.generate_name()
-
-    msg = f"Yay! You found {amount if amount > 1 else ''} {item.name}."
-    messages.success(request, msg)
+    outcome = actions.search(_get_active_character(request), times)
+    _flash(request, outcome)
 
-    return redirect("story")
+    return redirect("story" if outcome.ok else "character_detail")
 
 
 @login_required
 def inventory_drop(request, item_id, drop_all=False):
-    character = get_object_or_404(CharacterSelection, user=request.user).character
-    inventory = Inventory.objects.get(character=character)
-    item = get_object_or_404(Item, id=item_id, inventory=inventory)
-    drop_amount = 1 if not drop_all else item.amount
-    if item.blueprint.is_droppable:
-        if item.amount < 2 or drop_all:
-            item.inventory = None
-        else:
-            item.amount -= 1
-        item.save(update_fields=["amount", "inventory"])
-
-        messages.success(request, f"You've thrown away {drop_amount} {item.name}(s)")
-    else:
-        messages.error(request, "You can't drop this item.")
+    outcome = actions.drop(_get_active_character(request).inventory, item_id, drop_all)
+    _flash(request, outcome)
 
     return redirect("character_detail")
 
 
-def _update_gold(inventory):
-    level = inventory.character.level
-    update_amount = random.randint(level, level * 10)
-    gold_blueprint = ItemBlueprint.objects.get(name="gold")
-    item, _ = Item.objects.get_or_create(
-        inventory=inventory,
-        blueprint=gold_blueprint,
-        rarity=Item.Rarity.COMMON,
-        defaults={
-            "amount": 0,
-            "name": gold_blueprint.name,
-        }
-    )
-
-    item.amount += update_amount
-    item.save()
-
-    return item, update_amount
-
-
 @login_required
 def character_create_view(request):
     count_user_visit(request)
@@ -318,6 +206,7 @@ def character_create_view(request):
                 char, _ = Character.objects.get_or_create(name=name, user=user)
                 CharacterAttributes.objects.get_or_create(character=char)
                 Inventory.objects.get_or_create(character=char)
+                Wallet.objects.get_or_create(character=char)
 
             messages.success(request, "Character created!")
             return redirect("character_select", character_id=char.id)
@@ -328,6 +217,21 @@ def character_create_view(request):
     return render(request, "wwwhero/character_create.html", {"form": form})
 
 
+def _flash(request, outcome):
+    if outcome.ok:
+        messages.success(request, outcome.message)
+    else:
+        messages.error(request, outcome.message)
+
+
+def _get_active_character(request):
+    active = request.active_character
+    if not active:
+        raise Http404("No character selected")
+
+    return active
+
+
 def login_view(request):
     if request.user.is_authenticated:
         return redirect("index")
@@ -335,9 +239,6 @@ def login_view(request):
         form = AuthenticationForm(data=request.POST)
         if form.is_valid():
             login(request, form.get_user())
-            selected_char = CharacterSelection.objects.filter(user=request.user).first()
-            if selected_char:
-                request.session["character_id"] = selected_char.character.id
             return redirect("index")
     else:
         form = AuthenticationForm()
@@ -369,15 +270,3 @@ def signup_view(request):
             return redirect("index")
 
     return render(request, "wwwhero/signup.html", {"form": form})
-
-
-def count_user_visit(request):
-    user = request.user
-    if user.is_authenticated:
-        visitor, _ = UserVisit.objects.get_or_create(
-            user=user,
-            url=request.path,
-            method=request.method,
-        )
-        visitor.view = F("view") + 1
-        visitor.save()
@@ -0,0 +1,58 @@
+"""Page view counting for authenticated users.
+
+``settings.VISIT_COUNTER_MODE`` picks how visits reach ``UserVisit``:
+
+* ``"sync"`` - every request upserts its row right away (two queries);
+* ``"buffered"`` - increments are kept in-process per (user, url, method)
+  and written in bulk every ``settings.VISIT_COUNTER_FLUSH_INTERVAL``
+  seconds and on interpreter shutdown.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import F
+
+from wwwhero import dbpool
+from wwwhero.buffers import WriteBehindBuffer
+from wwwhero.bulk import bulk_increment
+from wwwhero.models import UserVisit
+
+SYNC = "sync"
+BUFFERED = "buffered"
+
+
+def _write_visits(records):
+    bulk_increment(UserVisit, ("user_id", "url", "method"), "view", Counter(records))
+
+
+_buffer = WriteBehindBuffer(
+    _write_visits,
+    interval=lambda: settings.VISIT_COUNTER_FLUSH_INTERVAL,
+)
+
+
+def count_user_visit(request):
+    user = request.user
+    if user.is_authenticated:
+        count_visit(user.id, request.path, request.method)
+
+
+def defer_user_visit(request):
+    """Count the visit in the DB pool, reading the request on this thread."""
+    user = request.user
+    if user.is_authenticated:
+        dbpool.defer(count_visit, user.id, request.path, request.method)
+
+
+def count_visit(user_id, url, method):
+    if settings.VISIT_COUNTER_MODE == BUFFERED:
+        _buffer.add((user_id, url, method))
+        return
+
+    visitor, _ = UserVisit.objects.get_or_create(user_id=user_id, url=url, method=method)
+    visitor.view = F("view") + 1
+    visitor.save(update_fields=["view"])
+
+
+def flush():
+    _buffer.flush()
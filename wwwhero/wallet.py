@@ -0,0 +1,30 @@
+"""Gold of the characters.
+
+A balance lives in the ``Wallet`` row of a character and only changes
+with F() increments, so concurrent credits can't lose updates. Every
+change is also recorded as a ``GoldLedgerEntry``, inserted in the same
+transaction as the increment, so the ledger always adds up to the
+balances: a credit costs one UPDATE and one INSERT.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from wwwhero.bulk import bulk_increment
+from wwwhero.models import GoldLedgerEntry, Wallet
+
+
+def credit(character_id, amount, reason):
+    """Add ``amount`` gold to the wallet of a character, creating a missing wallet."""
+    if not amount:
+        return
+
+    # no savepoint inside an outer transaction, the outer one is atomic already
+    with transaction.atomic(savepoint=False):
+        updated = Wallet.objects.filter(character_id=character_id).update(gold=F("gold") + amount)
+        if not updated:
+            bulk_increment(Wallet, ("character_id",), "gold", {(character_id,): amount})
+        GoldLedgerEntry.objects.create(character_id=character_id, amount=amount, reason=reason)
+
+
+def balance(character_id):
+    return Wallet.objects.filter(character_id=character_id).values_list("gold", flat=True).first() or 0
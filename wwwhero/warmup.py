@@ -0,0 +1,71 @@
+"""Warm-up of a fresh process before it serves requests.
+
+Run from ``WwwheroConfig.ready`` with ``settings.WARM_UP``: compiles the
+``wwwhero`` templates into the cached template loader, populates the URL
+resolver and loads the reference data caches (blueprints, locations,
+their loot tables and the image variants). Under gunicorn's ``preload_app`` this happens once in
+the master and the forked workers inherit the result, so the connections
+it opened are closed again before any fork.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.db import DatabaseError
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from wwwhero import dbpool, images, loot
+from wwwhero.catalog import get_catalog
+from wwwhero.locations import get_locations
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+# milliseconds per step of the last warm-up of this process
+timings = {}
+
+
+def _templates():
+    for path in sorted(TEMPLATE_DIR.glob("wwwhero/*.html")):
+        get_template(path.relative_to(TEMPLATE_DIR).as_posix())
+
+
+def _urls():
+    get_resolver().reverse_dict
+
+
+def _reference_data():
+    get_catalog()
+    images.get_variants()
+    for location in get_locations().active:
+        loot.get_loot_table(location)
+
+
+STEPS = (
+    ("templates", _templates),
+    ("urls", _urls),
+    ("reference data", _reference_data),
+)
+
+
+def warm_up():
+    """Run the warm-up steps and return their timings.
+
+    A step failing on the database, e.g. before the first migration, is
+    logged and skipped.
+    """
+    timings.clear()
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except DatabaseError:
+            logger.warning("Warm-up step %r failed", name, exc_info=True)
+            continue
+        timings[name] = (time.perf_counter() - start) * 1000
+
+    dbpool.close_connections()
+
+    return dict(timings)